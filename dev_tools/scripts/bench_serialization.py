@@ -0,0 +1,46 @@
+import os
+import sys
+import gzip
+import json
+import time
+import pandas as pd
+
+# Add the project root to sys.path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(PROJECT_ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from src.api.serialization import dumps, frame_to_records, brotli, orjson
+
+DATA_PATH = os.path.join(PROJECT_ROOT, "data", "insurer_communications.csv")
+
+def _best_of(fn, repeats=5):
+    """Returns (seconds, result) for the fastest of several runs."""
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def bench(rows):
+    base = pd.read_csv(DATA_PATH)
+    df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+    # Simulate partially enriched data so NaN handling is exercised
+    df["tone"] = ["Cooperative", None] * (len(df) // 2) + ["Cooperative"] * (len(df) % 2)
+
+    # Baseline: default FastAPI path (to_dict -> jsonable_encoder -> json.dumps)
+    before_s, before_body = _best_of(
+        lambda: json.dumps(jsonable_encoder(df.to_dict(orient="records"))).encode("utf-8")
+    )
+    after_s, after_body = _best_of(lambda: dumps(frame_to_records(df)))
+
+    print(f"Rows: {len(df)} | orjson: {orjson is not None} | brotli: {brotli is not None}")
+    print(f"  before: {before_s * 1000:8.1f} ms  {len(before_body):>10} bytes (identity)")
+    print(f"  after:  {after_s * 1000:8.1f} ms  {len(after_body):>10} bytes (identity)")
+    print(f"          {'':8}     {len(gzip.compress(after_body, compresslevel=5)):>10} bytes (gzip)")
+    if brotli is not None:
+        print(f"          {'':8}     {len(brotli.compress(after_body, quality=4)):>10} bytes (br)")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -3,19 +3,37 @@ import ssl
 import logging
 import traceback
 import json
-from typing import Optional, Dict, Any, Union, List
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Union, List, Tuple
+import numpy as np
 import pandas as pd
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
+
+from .dedup import cluster_texts
+from .plan_analysis import PlanAnalysis, analyze_plan, rewrite_plan
+from .query_engine import DuckDBEngine
+from .indexes import FrameIndex
+from .llm_scheduler import INTERACTIVE, get_scheduler
+from .sessions import Session
 
 # Configure logger for the agent
 logger = logging.getLogger("MDCCapital.Agent")
 
+_ssl_configured = False
+
 def setup_ssl_environment() -> None:
     """
     Configures the environment for SSL connectivity, handling custom 
     certificates often required in filtered corporate/production environments.
+    Runs once per process; later calls are no-ops.
     """
+    global _ssl_configured
+    if _ssl_configured:
+        return
+    _ssl_configured = True
+
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(current_dir)
 
@@ -41,8 +59,77 @@ def setup_ssl_environment() -> None:
         if hasattr(ssl, '_create_unverified_context'):
             ssl._create_default_https_context = ssl._create_unverified_context
 
-# Initialize SSL environment on module load
-setup_ssl_environment()
+# Enrichment batching: chunks adapt between MIN and MAX rows within a token budget
+INITIAL_CHUNK_SIZE = 15
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 60
+CHUNK_TOKEN_BUDGET = 4000
+CHARS_PER_TOKEN = 4
+ROW_TOKEN_OVERHEAD = 25
+VALID_TONES = ("Cooperative", "Obstructive")
+# Enrichment runs a row may fail before it is only retried on an explicit re-run
+MAX_ENRICHMENT_ATTEMPTS = 3
+
+# Re-prompts allowed when a plan still contains row-wise anti-patterns
+MAX_PLAN_REVISIONS = 1
+# Re-plans allowed when a plan fails to execute
+MAX_EXECUTION_RETRIES = 1
+
+# Gemini model per pipeline stage; enrichment and small reports use a cheaper tier
+DEFAULT_MODEL = "gemini-2.0-flash"
+STAGE_MODELS = {
+    "enrich": os.environ.get("MDC_MODEL_ENRICH", "gemini-2.0-flash-lite"),
+    "plan": os.environ.get("MDC_MODEL_PLAN", DEFAULT_MODEL),
+    "report": os.environ.get("MDC_MODEL_REPORT", DEFAULT_MODEL),
+    "report_simple": os.environ.get("MDC_MODEL_REPORT_SIMPLE", "gemini-2.0-flash-lite"),
+}
+# Results up to this size are reported by the "report_simple" model
+SIMPLE_RESULT_MAX_LINES = 6
+SIMPLE_RESULT_MAX_CHARS = 600
+
+# Batch workflow limits
+MAX_PARALLEL_PLANS = 8
+REPORT_BATCH_SIZE = 5
+
+# Prefix of the executor's message for a plan that raised
+EXECUTION_ERROR_PREFIX = "Error executing code"
+MISSING_RESULT = "No result variable set in code."
+
+# Matches "### Q<n>" section headers emitted by the batch planner/reporter
+_SECTION_PATTERN = re.compile(r"^\s*#{2,4}\s*Q(\d+)\b.*$", re.MULTILINE)
+
+def _is_execution_error(result: Any) -> bool:
+    return isinstance(result, str) and (result.startswith(EXECUTION_ERROR_PREFIX) or result == MISSING_RESULT)
+
+def _result_kind(result: Any) -> str:
+    """
+    Classifies an executor result for reporting: "error", "scalar" (a single
+    number or flag), "small" (a short table or text) or "full".
+    """
+    if _is_execution_error(result):
+        return "error"
+    if isinstance(result, (bool, int, float, np.bool_, np.number)):
+        return "scalar"
+    text = str(result)
+    if text.count("\n") < SIMPLE_RESULT_MAX_LINES and len(text) <= SIMPLE_RESULT_MAX_CHARS:
+        return "small"
+    return "full"
+
+def _format_scalar(value: Any) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "Yes" if value else "No"
+    if isinstance(value, (float, np.floating)):
+        if pd.isna(value):
+            return "n/a"
+        if float(value).is_integer():
+            return f"{int(value):,}"
+        # Fixed decimals would round small rates and ratios to 0.00
+        return f"{value:,.2f}" if abs(value) >= 1 else f"{value:,.4g}"
+    return f"{value:,}"
+
+def _template_answer(question: str, value: Any) -> str:
+    """Report for a single-value result, written without an LLM call."""
+    return f"**{_format_scalar(value)}**\n\nComputed directly from the dataset for: \"{question}\""
 
 class MDCCapitalAgent:
     """
@@ -50,142 +137,556 @@ class MDCCapitalAgent:
     Uses a "Plan-and-Execute" workflow for reliable business insights.
     """
     
-    def __init__(self, df: pd.DataFrame, api_key: str, model: str = "gemini-2.0-flash"):
+    def __init__(self, df: Optional[pd.DataFrame], api_key: str, model: Optional[str] = None,
+                 engine: Optional[DuckDBEngine] = None, index: Optional[FrameIndex] = None,
+                 enrichment_lock: Optional[threading.Lock] = None, session: Optional[Session] = None,
+                 enrichment_attempts: Optional[Dict[int, int]] = None):
         """
-        Initialize the agent with data and API configuration.
+        Initialize the agent with data and API configuration. With an `engine`
+        (out-of-core dataset) plans are SQL queries and `df` is not used. An
+        `index` over `df` is exposed to generated code as `idx`. Agents sharing
+        a frame should share an `enrichment_lock` so rows are labeled once,
+        and its `enrichment_attempts` (failed runs per row position).
+        With a `session`, `ask` can build on the intermediates of earlier turns.
+        Each stage uses the model in STAGE_MODELS unless `model` pins one
+        model for every stage.
         """
         self.df = df
+        self.engine = engine
+        self.index = index
+        self.enrichment_lock = enrichment_lock or threading.Lock()
+        self.enrichment_attempts = {} if enrichment_attempts is None else enrichment_attempts
+        self._enrichment_priority = INTERACTIVE
+        self.session = session
         self.api_key = api_key
-        self.llm = ChatGoogleGenerativeAI(
-            model=model, 
-            google_api_key=api_key, 
-            temperature=0,
-            transport="rest",
-        )
-        logger.info(f"Agent initialized with model: {model} (Plan-and-Execute Mode)")
+        # Row positions updated in place by the last enrichment pass
+        self.enriched_positions: List[int] = []
+        # Row positions the last enrichment pass could not label
+        self.unenriched_positions: List[int] = []
+        # Clustering and call counts reported by the last enrichment pass
+        self.enrichment_stats: Dict[str, int] = {}
+        self._enrichment_calls = 0
+        self.models = {stage: model or default for stage, default in STAGE_MODELS.items()}
+        self._clients: Dict[str, Any] = {}
+        self._llm = None
+        # LLM calls per stage, execution retries and skipped reports for the last question(s)
+        self.pipeline_stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        logger.info(f"Agent initialized with models: {self.models} (Plan-and-Execute Mode)")
+
+    def _client(self, stage: str):
+        """
+        The Gemini client for a pipeline stage, created on first use so that
+        requests which never reach the LLM do not pay for importing the
+        LangChain/Google stack. Stages on the same model share a client.
+        """
+        if self._llm is not None:
+            return self._llm
+        model = self.models[stage]
+        if model not in self._clients:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            setup_ssl_environment()
+            self._clients[model] = ChatGoogleGenerativeAI(
+                model=model, 
+                google_api_key=self.api_key, 
+                temperature=0,
+                transport="rest",
+            )
+        return self._clients[model]
+
+    @property
+    def llm(self):
+        """The planner's client."""
+        return self._client("plan")
+
+    @llm.setter
+    def llm(self, client) -> None:
+        # An explicit client serves every stage
+        self._llm = client
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.pipeline_stats[key] = self.pipeline_stats.get(key, 0) + n
+
+    def _invoke(self, prompt: str, priority: int = INTERACTIVE, stage: str = "plan") -> Any:
+        """Sends a prompt to the stage's model through the process-wide LLM scheduler."""
+        self._count(f"llm_calls_{stage}")
+        return get_scheduler().invoke(self._client(stage), prompt, self.api_key, priority)
+
+    def _request_labels(self, texts: pd.Series) -> Dict[int, Tuple[str, str]]:
+        """
+        Sends one chunk of texts to the LLM and returns the labels it produced,
+        keyed by row position. Rows with missing or malformed labels are omitted;
+        an unparseable response yields no labels at all. Errors from the call
+        itself (auth, quota, network) are raised: they are not the rows' fault
+        and re-sending smaller chunks would only fail the same way.
+        """
+        positions = list(texts.index)
+        formatted_texts = "\n".join([f"ID {idx}: {text}" for idx, text in enumerate(texts.tolist())])
         
+        prompt = f"""
+        Analyze the following insurance communication texts for MD Capital. 
+        For each entry, determine two attributes:
+        1. denial_category: Identify the primary reason for denial. Examples: "Missing Info", "Prior Auth", "Coding Error", "Medical Necessity", "Experimental", "Duplicate Claim".
+        2. tone: Determine if the insurer's communication tone is "Cooperative" or "Obstructive".
+
+        Return ONLY a valid JSON list of objects. NO OTHER TEXT.
+        FORMAT: [
+            {{"id": 0, "category": "Missing Info", "tone": "Obstructive"}},
+            ...
+        ]
+        
+        TEXTS:
+        {formatted_texts}
+        """
+        
+        self._enrichment_calls += 1
+        response = self._invoke(prompt, self._enrichment_priority, stage="enrich")
+        try:
+            content = str(response.content).strip()
+            
+            # Clean up JSON formatting if present in LLM output
+            if content.startswith("```json"):
+                content = content[7:-3].strip()
+            elif content.startswith("```"):
+                content = content[3:-3].strip()
+            
+            results = json.loads(content)
+        except Exception as e:
+            logger.error(f"Unparseable labels for chunk of {len(positions)} rows: {e}")
+            return {}
+
+        labels = {}
+        for item in results if isinstance(results, list) else []:
+            if not isinstance(item, dict):
+                continue
+            local_idx, category, tone = item.get("id"), item.get("category"), item.get("tone")
+            if (isinstance(local_idx, int) and 0 <= local_idx < len(positions)
+                    and isinstance(category, str) and category
+                    and tone in VALID_TONES):
+                labels[positions[local_idx]] = (category, tone)
+        return labels
+
+    def _label_rows(self, texts: pd.Series, labels: Optional[Dict[int, Tuple[str, str]]] = None) -> Dict[int, Tuple[str, str]]:
+        """
+        Labels a chunk (reusing `labels` from an attempt already made), re-sending
+        only the rows that came back missing. A chunk whose response is unusable
+        is bisected so a single bad row cannot sink its neighbours; a single row
+        that still fails is given up on. Failed calls are raised, not bisected.
+        """
+        labels = dict(self._request_labels(texts) if labels is None else labels)
+        missing = texts[~texts.index.isin(list(labels))]
+        if missing.empty or len(texts) == 1:
+            return labels
+
+        if len(missing) < len(texts):
+            labels.update(self._label_rows(missing))
+        else:
+            middle = len(texts) // 2
+            labels.update(self._label_rows(texts.iloc[:middle]))
+            labels.update(self._label_rows(texts.iloc[middle:]))
+        return labels
+
+    @staticmethod
+    def _take_chunk(texts: pd.Series, start: int, chunk_size: int) -> pd.Series:
+        """
+        Takes up to `chunk_size` texts from `start`, stopping early once the
+        estimated prompt tokens exceed the chunk token budget (always >= 1 row).
+        """
+        candidates = texts.iloc[start:start + chunk_size]
+        tokens = (candidates.str.len().fillna(0) // CHARS_PER_TOKEN + ROW_TOKEN_OVERHEAD).cumsum()
+        return candidates.iloc[:max(1, int((tokens <= CHUNK_TOKEN_BUDGET).sum()))]
+
+    def enrich(self, retry_exhausted: bool = False, priority: int = INTERACTIVE, wait: bool = True) -> bool:
+        """
+        Runs the enrichment pass under the shared enrichment lock and returns
+        whether it ran. With `retry_exhausted`, rows that used up their
+        automatic attempts are sent again as well.
+
+        A question being answered enriches at INTERACTIVE priority, since it
+        waits for the labels; bulk re-runs use BACKGROUND. Without `wait`, the
+        pass is skipped when another agent is already enriching this frame,
+        so a question is not held up behind someone else's enrichment.
+        """
+        if not self.enrichment_lock.acquire(blocking=wait):
+            logger.info("Enrichment already in progress for this dataset; answering with the current labels.")
+            return False
+        try:
+            if retry_exhausted:
+                self.enrichment_attempts.clear()
+            self._enrichment_priority = priority
+            self._enrich_data()
+            return True
+        finally:
+            self._enrichment_priority = INTERACTIVE
+            self.enrichment_lock.release()
+
     def _enrich_data(self):
         """
         Enriches the dataframe with 'denial_category' and 'tone' using LLM.
         This is a one-time preprocessing step that makes Pandas queries more powerful.
+        Rows the LLM could not label are left empty (unenriched) and are retried
+        by later runs instead of receiving placeholder labels, up to
+        MAX_ENRICHMENT_ATTEMPTS failed runs per row.
         """
-        # Skip if columns already exist
-        if 'denial_category' in self.df.columns and 'tone' in self.df.columns:
+        if self.engine is not None:
+            # Out-of-core datasets are read-only; labels must be present in the Parquet files
             return
 
-        logger.info("Executing Preprocessing Pipeline: Analyzing communication text...")
+        enriched = 'denial_category' in self.df.columns and 'tone' in self.df.columns
+        if enriched:
+            missing = (self.df['denial_category'].isna() | self.df['tone'].isna()).to_numpy()
+        else:
+            missing = np.ones(len(self.df), dtype=bool)
+        # Rows that failed too often wait for an explicit re-run
+        pending = missing.copy()
+        exhausted = [pos for pos, n in self.enrichment_attempts.items() if n >= MAX_ENRICHMENT_ATTEMPTS]
+        pending[exhausted] = False
         
-        texts_to_process = self.df['communication_text'].tolist()
-        num_records = len(texts_to_process)
+        # Skip if every row already carries its labels (or has no attempts left)
+        if not pending.any():
+            self.unenriched_positions = np.flatnonzero(missing).tolist()
+            return
+
+        logger.info(f"Executing Preprocessing Pipeline: Analyzing {int(pending.sum())} communication texts...")
         
-        # Batch processing to optimize API calls
-        chunk_size = 15
-        categories = ["Other"] * num_records
-        tones = ["Cooperative"] * num_records
+        # Work on row positions so the frame's index labels do not matter
+        all_texts = self.df['communication_text'].reset_index(drop=True)
+        texts = all_texts[pending]
         
-        for i in range(0, num_records, chunk_size):
-            chunk = texts_to_process[i:i + chunk_size]
-            formatted_texts = "\n".join([f"ID {idx}: {text}" for idx, text in enumerate(chunk)])
-            
-            prompt = f"""
-            Analyze the following insurance communication texts for MD Capital. 
-            For each entry, determine two attributes:
-            1. denial_category: Identify the primary reason for denial. Examples: "Missing Info", "Prior Auth", "Coding Error", "Medical Necessity", "Experimental", "Duplicate Claim".
-            2. tone: Determine if the insurer's communication tone is "Cooperative" or "Obstructive".
-
-            Return ONLY a valid JSON list of objects. NO OTHER TEXT.
-            FORMAT: [
-                {{"id": 0, "category": "Missing Info", "tone": "Obstructive"}},
-                ...
-            ]
-            
-            TEXTS:
-            {formatted_texts}
-            """
-            
-            try:
-                response = self.llm.invoke(prompt)
-                content = str(response.content).strip()
-                
-                # Clean up JSON formatting if present in LLM output
-                if content.startswith("```json"):
-                    content = content[7:-3].strip()
-                elif content.startswith("```"):
-                    content = content[3:-3].strip()
-                
-                results = json.loads(content)
-                for item in results:
-                    local_idx = item.get("id")
-                    if local_idx is not None:
-                        global_idx = i + local_idx
-                        if global_idx < num_records:
-                            categories[global_idx] = item.get("category", "Other")
-                            tones[global_idx] = item.get("tone", "Cooperative")
-            except Exception as e:
-                logger.error(f"Preprocessing failed for chunk {i}: {e}")
-                # Fallback values already initialized
-                continue
+        # Near-duplicate clustering: only one representative per cluster is sent
+        representative_of = pd.Series(texts.index[cluster_texts(texts.tolist())], index=texts.index)
+        representatives = texts[texts.index.isin(representative_of.unique())]
+        self._enrichment_calls = 0
+        
+        # Adaptive batching: grow while chunks parse cleanly, shrink on failures
+        chunk_size = INITIAL_CHUNK_SIZE
+        representative_labels: Dict[int, Tuple[str, str]] = {}
+        start = 0
+        try:
+            while start < len(representatives):
+                chunk = self._take_chunk(representatives, start, chunk_size)
+                first_pass = self._request_labels(chunk)
+
+                if len(first_pass) == len(chunk):
+                    chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+                    representative_labels.update(first_pass)
+                else:
+                    chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+                    representative_labels.update(self._label_rows(chunk, first_pass))
+                start += len(chunk)
+        except Exception as e:
+            # The LLM call itself failed; keep what was labeled and stop this pass
+            logger.error(f"Enrichment aborted after {self._enrichment_calls} LLM calls: {e}")
+        # Representatives whose chunk was fully worked through; only their failures count
+        attempted = set(representatives.index[:start])
+
+        # Spread each representative's labels to every member of its cluster
+        labels = {
+            pos: representative_labels[rep]
+            for pos, rep in representative_of.items()
+            if rep in representative_labels
+        }
+        calls = self._enrichment_calls
+        self.enrichment_stats = {
+            "rows": len(texts),
+            "clusters": len(representatives),
+            "llm_calls": calls,
+            # Calls the skipped duplicates would have needed at the observed rows per call
+            "llm_calls_avoided": round((len(texts) - len(representatives)) * calls / max(len(representatives), 1)),
+        }
+        logger.info(
+            f"Deduplication: {len(texts)} texts in {len(representatives)} clusters; "
+            f"{calls} LLM calls made, ~{self.enrichment_stats['llm_calls_avoided']} avoided."
+        )
+
+        # Unlabeled rows stay empty so later runs can pick them up
+        if enriched:
+            categories = self.df['denial_category'].to_numpy(dtype=object, copy=True)
+            tones = self.df['tone'].to_numpy(dtype=object, copy=True)
+        else:
+            categories = np.full(len(self.df), None, dtype=object)
+            tones = np.full(len(self.df), None, dtype=object)
+        for pos, (category, tone) in labels.items():
+            categories[pos] = category
+            tones[pos] = tone
 
         # Add the new columns to the dataframe
         self.df['denial_category'] = categories
         self.df['tone'] = tones
-        logger.info(f"Preprocessing Pipeline complete. Enriched {num_records} records.")
+        self.enriched_positions = sorted(labels)
+        for pos in labels:
+            self.enrichment_attempts.pop(pos, None)
+        for pos, rep in representative_of.items():
+            if pos not in labels and rep in attempted:
+                self.enrichment_attempts[pos] = self.enrichment_attempts.get(pos, 0) + 1
+        self.unenriched_positions = np.flatnonzero(pd.isna(categories) | pd.isna(tones)).tolist()
+        if self.unenriched_positions:
+            gave_up = sum(1 for n in self.enrichment_attempts.values() if n >= MAX_ENRICHMENT_ATTEMPTS)
+            logger.warning(
+                f"{len(self.unenriched_positions)} records remain unenriched; {gave_up} of them reached "
+                f"{MAX_ENRICHMENT_ATTEMPTS} failed runs and are only retried by an explicit re-run."
+            )
+        logger.info(f"Preprocessing Pipeline complete. Enriched {len(labels)} records.")
 
-    def _planner(self, question: str) -> str:
+    def _schema_description(self) -> str:
         """
-        The Planner: LLM writes Python/Pandas code to solve the user's question.
+        Builds a compact schema description of the dataframe for planner prompts.
         """
+        if self.engine is not None:
+            return self.engine.schema_description()
+        
         schema_info = []
         for col, dtype in self.df.dtypes.items():
             sample = self.df[col].dropna().unique()[:3]
             schema_info.append(f"- {col} ({dtype}): e.g., {list(sample)}")
         
-        schema_str = "\n".join(schema_info)
+        return "\n".join(schema_info)
+
+    @staticmethod
+    def _extract_code(text: str) -> str:
+        """
+        Strips Markdown code fences from an LLM response.
+        """
+        code = text.strip()
+        if "```python" in code:
+            code = code.split("```python")[1].split("```")[0].strip()
+        elif "```sql" in code:
+            code = code.split("```sql")[1].split("```")[0].strip()
+        elif "```" in code:
+            code = code.split("```")[1].split("```")[0].strip()
+        return code
+
+    @staticmethod
+    def _split_sections(text: str) -> Dict[int, str]:
+        """
+        Splits a batch LLM response into its "### Q<n>" sections, keyed by n.
+        """
+        sections = {}
+        matches = list(_SECTION_PATTERN.finditer(text))
+        for pos, match in enumerate(matches):
+            end = matches[pos + 1].start() if pos + 1 < len(matches) else len(text)
+            body = text[match.end():end].strip()
+            if body:
+                sections[int(match.group(1))] = body
+        return sections
+
+    def _plan_target(self) -> Dict[str, Any]:
+        """
+        Describes what the planner must produce for this agent's execution
+        backend: pandas code run against `df`, or a DuckDB SQL query over the
+        Parquet-backed view `df`.
+        """
+        if self.engine is not None:
+            return {
+                "task": "Write a DuckDB SQL query",
+                "schema_title": "TABLE SCHEMA (`df`)",
+                "context": "The data is available as the SQL table 'df'. The query's result set is the answer.",
+                "language": "sql",
+                "label": "SQL Query",
+                "rules": [
+                    "Write a single read-only SELECT statement (CTEs allowed) in the DuckDB dialect.",
+                    "Only reference the table 'df'; do not create, modify or export anything.",
+                    "Aggregate in SQL (GROUP BY, COUNT, AVG, window functions) rather than returning raw rows.",
+                    "If you need to analyze text, use ILIKE, regexp_matches or string functions.",
+                    "Always add a LIMIT (at most 200 rows) when the result is a row listing.",
+                    "Focus on accuracy and business logic.",
+                ],
+            }
+        rules = [
+            "Use strictly pandas and standard Python.",
+            "Do not assume any external variables (like 'stop_words') or libraries are available.",
+            "If you need to analyze text, use simple pandas string operations (e.g., .str.contains, .value_counts).",
+            "Focus on accuracy and business logic.",
+            "Keep the code vectorized: no iterrows/itertuples, no apply(axis=1), no Python loops over rows.",
+        ]
+        if self.index is not None:
+            rules.append(
+                f"To filter on {', '.join(self.index.columns)}, prefer the prebuilt index 'idx' over boolean masks: "
+                "df.iloc[idx.positions(insurer_name='Aetna', days_since_submission=(30, None))]. "
+                "A scalar or list is an equality match, a (low, high) tuple is an inclusive range (None = open)."
+            )
+        return {
+            "task": "Write Python code using pandas",
+            "schema_title": "DATAFRAME SCHEMA (`df`)",
+            "context": "The DataFrame is already loaded as 'df'.",
+            "language": "python",
+            "label": "Python Code",
+            "rules": rules,
+        }
+
+    @staticmethod
+    def _numbered(rules: List[str], indent: str = "        ") -> str:
+        return f"\n{indent}".join(f"{n}. {rule}" for n, rule in enumerate(rules, start=1))
+
+    def _planner(self, question: str, feedback: Optional[str] = None, previous_code: Optional[str] = None) -> str:
+        """
+        The Planner: LLM writes Python/Pandas code (or SQL for out-of-core
+        datasets) to solve the user's question. When `feedback` is given, the
+        previous plan is shown with the problems to fix.
+        """
+        schema_str = self._schema_description()
+        target = self._plan_target()
+        
+        review = ""
+        if feedback:
+            review = f"""
+        ### REVIEW OF YOUR PREVIOUS PLAN ###
+        {previous_code}
+        
+        Problems found:
+        {feedback}
+        Rewrite the plan so that it fixes these problems.
+        """
+        
+        if self.engine is None:
+            output_rule = "ONLY output the Python code block. No explanations."
+            result_rule = "Your code should calculate the answer and store it in a variable named 'result'."
+            reuse_rule = ("If the question follows up on an earlier one, start from the cached variables "
+                          "instead of recomputing them from 'df'. Give new intermediate DataFrames descriptive names.")
+        else:
+            output_rule = "ONLY output the SQL code block. No explanations."
+            result_rule = "Your query should calculate the answer."
+            reuse_rule = "If the question follows up on an earlier one, reuse the earlier query (e.g. as a CTE)."
+        
+        conversation = ""
+        if self.session is not None and self.session.history:
+            conversation = f"""
+        ### CONVERSATION SO FAR ###
+        {self.session.describe()}
+        {reuse_rule}
+        """
         
         prompt = f"""
-        You are a Data Analyst for MD Capital. Write Python code using pandas to answer the question below.
+        You are a Data Analyst for MD Capital. {target["task"]} to answer the question below.
         
-        ### DATAFRAME SCHEMA (`df`) ###
+        ### {target["schema_title"]} ###
         {schema_str}
         
-        The DataFrame is already loaded as 'df'.
-        Your code should calculate the answer and store it in a variable named 'result'.
+        {target["context"]}
+        {result_rule}
         
         Rules:
-        1. ONLY output the Python code block. No explanations.
-        2. Use strictly pandas and standard Python.
-        3. Do not assume any external variables (like 'stop_words') or libraries are available.
-        4. If you need to analyze text, use simple pandas string operations (e.g., .str.contains, .value_counts).
-        5. Focus on accuracy and business logic.
-        
+        {self._numbered([output_rule] + target["rules"])}
+        {conversation}
+        {review}
         User Question: {question}
         
-        Python Code:
+        {target["label"]}:
         """
         
-        response = self.llm.invoke(prompt)
-        code = str(response.content).strip()
+        response = self._invoke(prompt)
+        return self._extract_code(str(response.content))
+
+    def _batch_planner(self, questions: List[str]) -> List[str]:
+        """
+        The Batch Planner: a single LLM call writes one code block per question.
+        Questions whose block is missing from the response are planned individually.
+        """
+        schema_str = self._schema_description()
+        target = self._plan_target()
+        numbered = "\n".join(f"Q{n}: {q}" for n, q in enumerate(questions, start=1))
         
-        # Clean up Markdown formatting if present
-        if "```python" in code:
-            code = code.split("```python")[1].split("```")[0].strip()
-        elif "```" in code:
-            code = code.split("```")[1].split("```")[0].strip()
-            
-        return code
+        if self.engine is None:
+            result_rule = "Each code block is executed independently and must store its answer in a variable named 'result'."
+        else:
+            result_rule = "Each query is executed independently; its result set is the answer."
+        rules = [
+            f"For every question output a header line \"### Q<number>\" followed by exactly one ```{target['language']} code block.",
+            "No explanations outside the code blocks.",
+        ] + target["rules"]
+        
+        prompt = f"""
+        You are a Data Analyst for MD Capital. {target["task"]} to answer EACH question below.
+        
+        ### {target["schema_title"]} ###
+        {schema_str}
+        
+        {target["context"]}
+        {result_rule}
+        
+        Rules:
+        {self._numbered(rules)}
+        
+        User Questions:
+        {numbered}
+        
+        {target["label"]}:
+        """
+        
+        response = self._invoke(prompt)
+        sections = self._split_sections(str(response.content))
+        
+        plans = []
+        for n, question in enumerate(questions, start=1):
+            if n in sections:
+                plans.append(self._extract_code(sections[n]))
+            else:
+                logger.warning(f"Batch plan missing for Q{n}; planning individually.")
+                plans.append(self._planner(question))
+        return plans
 
-    def _executor(self, code: str) -> Any:
+    def _review_plan(self, question: str, code: str) -> Tuple[str, Optional[PlanAnalysis]]:
         """
-        The Executor: Runs the generated code against the dataframe.
+        The Plan Gate: statically checks a plan for row-wise anti-patterns,
+        rewrites known patterns to vectorized form and re-prompts the planner
+        with targeted feedback for the rest. SQL plans are passed through.
+        """
+        if self.engine is not None:
+            return code, None
+        rows = len(self.df)
+        
+        def vet(candidate: str) -> Tuple[str, PlanAnalysis]:
+            rewritten, applied = rewrite_plan(candidate)
+            if applied:
+                logger.info(f"Plan rewritten to vectorized form: {', '.join(applied)}")
+            return rewritten, analyze_plan(rewritten)
+        
+        code, analysis = vet(code)
+        for _ in range(MAX_PLAN_REVISIONS):
+            if analysis.parse_error or not analysis.blocking:
+                break
+            logger.warning(f"Plan rejected by static analysis ({analysis.complexity}):\n{analysis.feedback()}")
+            revised, revised_analysis = vet(self._planner(question, analysis.feedback(), code))
+            if revised_analysis.parse_error is None and \
+                    revised_analysis.estimated_cost(rows) <= analysis.estimated_cost(rows):
+                code, analysis = revised, revised_analysis
+        return code, analysis
+
+    def _executor(self, code: str, df: Optional[pd.DataFrame] = None, analysis: Optional[PlanAnalysis] = None,
+                  namespace: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        The Executor: Runs the generated code against a shallow view of the
+        dataframe (or against the given snapshot of it), logging estimated vs.
+        measured cost. Plans never modify the shared frame: stores only change
+        it through enrichment, which keeps their cached indexes and payloads valid.
+        Variables in `namespace` are visible to the code; on success it is
+        updated with everything the code defined.
         """
         logger.info(f"Executing Plan:\n{code}")
         
+        if self.engine is not None:
+            return self._sql_executor(code)
+        
         # Use a localized scope for execution
-        local_vars = {"df": self.df, "pd": pd}
+        local_vars = {**(namespace or {}), "df": self.df.copy(deep=False) if df is None else df, "pd": pd}
+        if self.index is not None:
+            local_vars["idx"] = self.index
         try:
             # We use exec() but only provide the df and necessary libs
+            started = time.perf_counter()
             exec(code, {"__builtins__": __builtins__}, local_vars)
-            result = local_vars.get("result", "No result variable set in code.")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if analysis is not None:
+                rows = len(local_vars["df"])
+                logger.info(
+                    f"Plan cost: estimated {analysis.complexity}, ~{analysis.estimated_cost(rows)} row-ops "
+                    f"on {rows} rows; measured {elapsed_ms:.1f} ms"
+                )
+            if namespace is not None:
+                namespace.update(local_vars)
+            result = local_vars.get("result", MISSING_RESULT)
             
             # Format result if it's a DF/Series
             if isinstance(result, (pd.DataFrame, pd.Series)):
@@ -193,9 +694,25 @@ class MDCCapitalAgent:
             return result
         except Exception as e:
             logger.error(f"Execution Error: {str(e)}\n{traceback.format_exc()}")
-            return f"Error executing code: {str(e)}"
+            return f"{EXECUTION_ERROR_PREFIX}: {str(e)}"
+
+    def _sql_executor(self, sql: str) -> Any:
+        """
+        Runs a SQL plan (a single SELECT) on the out-of-core engine. A 1x1 result is returned
+        as a scalar, anything else as a table.
+        """
+        try:
+            started = time.perf_counter()
+            result = self.engine.execute_plan(sql)
+            logger.info(f"Plan cost: SQL returned {len(result)} rows; measured {(time.perf_counter() - started) * 1000:.1f} ms")
+            if result.shape == (1, 1):
+                return result.iloc[0, 0]
+            return result.to_string()
+        except Exception as e:
+            logger.error(f"Execution Error: {str(e)}\n{traceback.format_exc()}")
+            return f"{EXECUTION_ERROR_PREFIX}: {str(e)}"
 
-    def _reporter(self, question: str, raw_result: Any) -> str:
+    def _reporter(self, question: str, raw_result: Any, stage: str = "report") -> str:
         """
         The Reporter: Turns raw Pandas output into a high-impact executive insight.
         """
@@ -215,29 +732,156 @@ class MDCCapitalAgent:
         Response:
         """
         
-        response = self.llm.invoke(prompt)
+        response = self._invoke(prompt, stage=stage)
         return str(response.content).strip()
 
+    def _report(self, question: str, raw_result: Any) -> str:
+        """
+        Reports one result at the cost it needs: single values are templated
+        without an LLM call, short results go to the simple-report model and
+        everything else to the full reporter.
+        """
+        kind = _result_kind(raw_result)
+        if kind == "error":
+            self._count("reports_skipped")
+            return f"Strategic Analysis Failed: the generated analysis could not be executed ({raw_result})"
+        if kind == "scalar":
+            self._count("reports_skipped")
+            return _template_answer(question, raw_result)
+        return self._reporter(question, raw_result, "report_simple" if kind == "small" else "report")
+
+    def _run_plan(self, question: str, code: str, analysis: Optional[PlanAnalysis], df: Optional[pd.DataFrame] = None,
+                  namespace: Optional[Dict[str, Any]] = None) -> Tuple[str, Any]:
+        """
+        Executes a plan; when it fails, re-plans with the error as feedback
+        (up to MAX_EXECUTION_RETRIES) instead of reporting the failure.
+        Returns the code that ran last and its result.
+        """
+        raw_result = self._executor(code, df, analysis, namespace)
+        for _ in range(MAX_EXECUTION_RETRIES):
+            if not _is_execution_error(raw_result):
+                break
+            logger.warning(f"Plan failed to execute, re-planning: {raw_result}")
+            self._count("execution_retries")
+            feedback = f"- Running the plan failed: {raw_result}"
+            code, analysis = self._review_plan(question, self._planner(question, feedback, code))
+            raw_result = self._executor(code, df, analysis, namespace)
+        return code, raw_result
+
+    def _batch_reporter(self, questions: List[str], raw_results: List[Any]) -> List[str]:
+        """
+        The Batch Reporter: writes the insights for several questions per LLM call.
+        Single values and failures are reported without the LLM, and sections
+        missing from a response are reported individually.
+        """
+        reports: List[Optional[str]] = [None] * len(questions)
+        pending = []
+        for position, (question, raw_result) in enumerate(zip(questions, raw_results)):
+            if _result_kind(raw_result) in ("scalar", "error"):
+                reports[position] = self._report(question, raw_result)
+            else:
+                pending.append(position)
+        
+        for start in range(0, len(pending), REPORT_BATCH_SIZE):
+            positions = pending[start:start + REPORT_BATCH_SIZE]
+            group = [(questions[p], raw_results[p]) for p in positions]
+            stage = "report_simple" if all(_result_kind(r) == "small" for _, r in group) else "report"
+            blocks = "\n\n".join(
+                f"Q{n}: \"{q}\"\nRAW ANALYSIS DATA: {r}"
+                for n, (q, r) in enumerate(group, start=1)
+            )
+            
+            prompt = f"""
+            You are a Senior Strategic Analyst at MD Capital. Provide a high-impact, data-driven response to EACH query below.
+
+            {blocks}
+
+            INSTRUCTIONS:
+            1. For every query output a header line "### Q<number>" followed by its response.
+            2. NO CONVERSATIONAL FILLER. Do not say "Good morning", "Here is the report", "Today we focus on", or "I hope this helps".
+            3. START WITH THE DATA. Provide the direct answer first.
+            4. BE CONCISE. Use bullet points for multiple findings.
+            5. USE BOLDING for key metrics and insurers.
+            6. ADD A "STRATEGIC IMPACT" sentence at the end of each response explaining what this data means for MD Capital's bottom line.
+            
+            Responses:
+            """
+            
+            response = self._invoke(prompt, stage=stage)
+            sections = self._split_sections(str(response.content))
+            for n, (position, (question, raw_result)) in enumerate(zip(positions, group), start=1):
+                if n in sections:
+                    reports[position] = sections[n]
+                else:
+                    logger.warning(f"Batch report missing for question {position + 1}; reporting individually.")
+                    reports[position] = self._report(question, raw_result)
+        return reports
+
     def ask(self, question: str) -> str:
         """
         Processes a query using the Plan-and-Execute workflow.
         """
         logger.info(f"Agent received question: {question}")
+        self.pipeline_stats = {}
+        started = time.perf_counter()
         
         try:
             # 0. Preprocess / Enrich Data
-            self._enrich_data()
+            self.enrich(wait=False)
             
-            # 1. Plan
-            code = self._planner(question)
+            # 1. Plan (then vet it for row-wise anti-patterns)
+            code, analysis = self._review_plan(question, self._planner(question))
             
-            # 2. Execute
-            raw_result = self._executor(code)
+            # 2. Execute on a shallow view (with the session's cached intermediates in scope),
+            #    re-planning on failure
+            view = self.df.copy(deep=False) if self.df is not None else None
+            namespace = self.session.variables() if self.session is not None else None
+            code, raw_result = self._run_plan(question, code, analysis, view, namespace)
+            if self.session is not None and not _is_execution_error(raw_result):
+                self.session.record(question, code, namespace, source=view)
             
-            # 3. Report
-            final_answer = self._reporter(question, raw_result)
+            # 3. Report (templated or on a cheaper model when the result is trivial)
+            final_answer = self._report(question, raw_result)
             
+            logger.info(f"Question answered in {(time.perf_counter() - started) * 1000:.0f} ms; {self.pipeline_stats}")
             return final_answer
         except Exception as e:
             logger.error(f"Workflow Exception: {str(e)}")
             return f"Strategic Analysis Failed: {str(e)}"
+
+    def ask_batch(self, questions: List[str]) -> List[str]:
+        """
+        Processes several queries with a shared Plan-and-Execute workflow:
+        one enrichment pass, one combined planning call, parallel execution
+        against the same data snapshot and grouped reporting calls.
+        """
+        logger.info(f"Agent received batch of {len(questions)} questions")
+        self.pipeline_stats = {}
+        started = time.perf_counter()
+        
+        try:
+            # 0. Preprocess / Enrich Data (once for the whole batch)
+            self.enrich(wait=False)
+            snapshot = self.df
+            view = (lambda: snapshot.copy(deep=False)) if snapshot is not None else (lambda: None)
+            
+            # 1. Plan (single combined call, then vet each plan)
+            plans = [
+                self._review_plan(question, code)
+                for question, code in zip(questions, self._batch_planner(questions))
+            ]
+            
+            # 2. Execute in parallel; each plan gets its own shallow view of the snapshot
+            workers = min(len(plans), MAX_PARALLEL_PLANS)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                raw_results = list(pool.map(
+                    lambda args: self._run_plan(args[0], args[1][0], args[1][1], view())[1], zip(questions, plans)
+                ))
+            
+            # 3. Report (grouped calls)
+            reports = self._batch_reporter(questions, raw_results)
+            logger.info(f"Batch answered in {(time.perf_counter() - started) * 1000:.0f} ms; {self.pipeline_stats}")
+            return reports
+        except Exception as e:
+            logger.error(f"Batch Workflow Exception: {str(e)}")
+            return [f"Strategic Analysis Failed: {str(e)}"] * len(questions)
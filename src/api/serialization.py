@@ -0,0 +1,114 @@
+import gzip
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import Request, Response
+
+# orjson and brotli are optional accelerators; the stdlib paths are used without them
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+logger = logging.getLogger("MDCCapital.Serialization")
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+def _default(obj: Any) -> Any:
+    """Fallback encoder for numpy/pandas values not handled natively."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(payload: Any) -> bytes:
+    """Encodes a payload to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+def _column_values(series: pd.Series) -> List[Any]:
+    """Converts one column to native Python values, with missing values as None."""
+    if series.dtype.kind in "biu":
+        return series.tolist()
+    missing = series.isna()
+    if not missing.any():
+        return series.tolist()
+    return series.astype(object).where(~missing, None).tolist()
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Builds row records straight from column arrays. Avoids the per-cell
+    overhead of `to_dict(orient="records")` and maps NaN/NaT to None.
+    """
+    names = [str(col) for col in df.columns]
+    columns = [_column_values(df[col]) for col in df.columns]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks the best supported content coding from an Accept-Encoding header."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            offered[token.lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def json_response(request: Request, payload: Any = None, body: Optional[bytes] = None) -> Response:
+    """
+    Builds a JSON response from a payload (or pre-encoded body), compressed
+    according to the client's Accept-Encoding. Serialization and compression
+    times are reported through the Server-Timing header.
+    """
+    timings = []
+    if body is None:
+        started = time.perf_counter()
+        body = dumps(payload)
+        timings.append(f"serialize;dur={(time.perf_counter() - started) * 1000:.2f}")
+
+    raw_size = len(body)
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = None
+    if raw_size >= MIN_COMPRESS_BYTES:
+        encoding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        started = time.perf_counter()
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        timings.append(f"compress;dur={(time.perf_counter() - started) * 1000:.2f}")
+        headers["Content-Encoding"] = encoding
+    if timings:
+        headers["Server-Timing"] = ", ".join(timings)
+
+    logger.debug(f"{request.url.path}: {raw_size} bytes -> {len(body)} bytes ({encoding or 'identity'})")
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-import pandas as pd
 import os
 import logging
-from typing import List, Dict, Any
+from typing import List, Optional
 
-from ..agent import MDCCapitalAgent
-from ..utils import load_data, get_data_summary
+from ..agent import MDCCapitalAgent, setup_ssl_environment
+from ..utils import load_data
+from ..llm_scheduler import BACKGROUND, get_scheduler
+from ..sessions import Session, SessionStore
+from ..indexes import index_filters
+from .store import DatasetStore, DatasetRegistry, discover_datasets
+from .serialization import json_response, dumps, frame_to_records
 
 # Configure logging for the API server
 logging.basicConfig(
@@ -21,62 +25,252 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Resolve project root and data path
+# Resolve project root and data locations
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-DATA_PATH = os.path.join(PROJECT_ROOT, "data", "insurer_communications.csv")
+DATA_DIR = os.environ.get("MDC_DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
+DEFAULT_DATASET = os.environ.get("MDC_DEFAULT_DATASET", "insurer_communications")
+MEMORY_BUDGET_MB = int(os.environ.get("MDC_MEMORY_BUDGET_MB", "1024"))
+
+# Upper bound on questions accepted by a single batch request
+MAX_BATCH_QUESTIONS = 25
 
 # Global state
-df = pd.DataFrame()
+registry = DatasetRegistry({}, DEFAULT_DATASET, MEMORY_BUDGET_MB * 2**20, load_data)
+sessions = SessionStore()
 
 @app.on_event("startup")
 async def startup_event():
-    """Initializes the server by loading data on startup."""
-    global df
-    if os.path.exists(DATA_PATH):
-        df = load_data(DATA_PATH)
-        if not df.empty:
-            logger.info(f"System ready. Loaded {len(df)} records.")
+    """Initializes the server by registering the available datasets (loaded lazily)."""
+    setup_ssl_environment()
+    if os.environ.get("MDC_PROFILE_STARTUP") == "1":
+        from ..profiling import profile_imports, summarize, format_report
+        logger.info(format_report(summarize("src.api.server", profile_imports("src.api.server"))))
+    registry.sources = discover_datasets(DATA_DIR) if os.path.isdir(DATA_DIR) else {}
+    if not registry.sources:
+        logger.error(f"Critical Error: No datasets found in {DATA_DIR}")
     else:
-        logger.error(f"Critical Error: Data file not found at {DATA_PATH}")
+        logger.info(f"System ready. Registered datasets: {', '.join(registry.names())}")
+        if DEFAULT_DATASET not in registry.sources:
+            logger.warning(f"Default dataset '{DEFAULT_DATASET}' not found in {DATA_DIR}")
+
+def _get_store(dataset: Optional[str]) -> DatasetStore:
+    """Resolves a dataset name (default if None) to its store, or 404s."""
+    try:
+        return registry.get(dataset)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset or DEFAULT_DATASET}")
 
 class QueryRequest(BaseModel):
     """Schema for incoming LLM query requests."""
     question: str
     api_key: str
+    dataset: Optional[str] = None
+    # Follow-up questions sharing a session_id can reuse earlier intermediates
+    session_id: Optional[str] = None
+
+class EnrichRequest(BaseModel):
+    """Schema for explicit enrichment re-runs."""
+    api_key: str
+    dataset: Optional[str] = None
+
+class BatchQueryRequest(BaseModel):
+    """Schema for incoming batched LLM query requests."""
+    questions: List[str]
+    api_key: str
+    dataset: Optional[str] = None
+
+def _make_agent(store: DatasetStore, api_key: str, session: Optional[Session] = None) -> MDCCapitalAgent:
+    """Builds an agent bound to the store's data and execution backend."""
+    if store.engine is not None:
+        return MDCCapitalAgent(None, api_key, engine=store.engine, session=session)
+    return MDCCapitalAgent(store.df, api_key, index=store.index(), enrichment_lock=store.enrichment_lock,
+                           session=session, enrichment_attempts=store.enrichment_attempts)
+
+def _record_enrichment(store: DatasetStore, agent: MDCCapitalAgent) -> None:
+    """Advances the dataset version for rows the agent enriched in place."""
+    if agent.enriched_positions:
+        store.mark_changed(agent.enriched_positions)
 
-@app.get("/summary", response_model=Dict[str, Any])
-async def get_summary():
+@app.get("/datasets")
+async def list_datasets():
+    """Lists the registered datasets and which of them are currently loaded."""
+    return {
+        "datasets": registry.describe(),
+        "memory_bytes": registry.memory_usage(),
+        "memory_budget_bytes": registry.memory_budget_bytes,
+    }
+
+# Dataset endpoints are synchronous: the first request for a dataset loads it
+# (CSV parse or DuckDB open), which must not run on the event loop.
+@app.get("/health")
+def get_health(dataset: Optional[str] = None):
+    """Lightweight liveness probe exposing the dataset's current version."""
+    store = _get_store(dataset)
+    return {
+        "dataset": dataset or DEFAULT_DATASET,
+        "status": "ok" if not store.is_empty else "empty",
+        "records": store.record_count,
+        "epoch": store.epoch,
+        "version": store.version,
+    }
+
+@app.get("/summary", response_class=Response)
+def get_summary(request: Request, dataset: Optional[str] = None):
     """Returns a statistical summary of the loaded data."""
-    if df.empty:
+    store = _get_store(dataset)
+    if store.is_empty:
         raise HTTPException(status_code=503, detail="Data repository unavailable")
-    return get_data_summary(df)
+    return json_response(request, store.summary())
 
-@app.get("/data", response_model=List[Dict[str, Any]])
-async def get_raw_data():
-    """Returns the full raw dataset in JSON format."""
-    if df.empty:
-        return []
-    return df.to_dict(orient="records")
+@app.get("/aggregates", response_class=Response)
+def get_aggregates(request: Request, dataset: Optional[str] = None):
+    """Returns precomputed chart inputs for the current dataset version."""
+    store = _get_store(dataset)
+    if store.is_empty:
+        raise HTTPException(status_code=503, detail="Data repository unavailable")
+    return json_response(request, {
+        "epoch": store.epoch,
+        "version": store.version,
+        **store.aggregates(),
+    })
+
+@app.get("/data", response_class=Response)
+def get_raw_data(request: Request, dataset: Optional[str] = None,
+                       insurer_name: Optional[List[str]] = Query(None),
+                       claim_status: Optional[List[str]] = Query(None),
+                       direction: Optional[List[str]] = Query(None),
+                       urgency: Optional[List[int]] = Query(None),
+                       min_days: Optional[float] = None, max_days: Optional[float] = None):
+    """
+    Returns the raw dataset in JSON format. Repeatable equality filters
+    (?insurer_name=A&insurer_name=B) and a days_since_submission range are
+    resolved through the dataset's indexes.
+    """
+    store = _get_store(dataset)
+    if store.is_empty:
+        return json_response(request, [])
+    filters = index_filters({
+        "insurer_name": insurer_name,
+        "claim_status": claim_status,
+        "direction": direction,
+        "urgency": urgency,
+        "days_since_submission": (min_days, max_days),
+    })
+    if filters:
+        try:
+            return json_response(request, frame_to_records(store.filtered(filters)))
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    # The encoded body is reused until the dataset version changes
+    body = store.cached("data_json", lambda _: dumps(frame_to_records(store.frame())))
+    return json_response(request, body=body)
+
+@app.get("/data/delta", response_class=Response)
+def get_data_delta(request: Request, since: int = Query(0, ge=0), epoch: Optional[str] = None,
+                         dataset: Optional[str] = None):
+    """
+    Returns the rows changed after dataset version `since`.
+    Falls back to the full dataset (full=true) when the client's epoch is stale.
+    """
+    store = _get_store(dataset)
+    full, rows = store.changed_since(since, epoch)
+    return json_response(request, {
+        "epoch": store.epoch,
+        "version": store.version,
+        "full": full,
+        "row_ids": rows.index.tolist(),
+        "rows": frame_to_records(rows),
+    })
 
+@app.get("/llm/metrics")
+async def get_llm_metrics():
+    """Queue depth, pacing and usage of the shared LLM scheduler, per API key."""
+    return get_scheduler().metrics()
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    """Discards a conversation session and its cached intermediates."""
+    return {"deleted": sessions.drop(session_id)}
+
+# The LLM endpoints are synchronous so FastAPI runs them on its thread pool;
+# concurrent requests then compete through the LLM scheduler instead of the event loop.
 @app.post("/ask")
-async def ask_agent(request: QueryRequest):
+def ask_agent(request: QueryRequest):
     """
     Proxies a question to the MDCCapitalAgent for LLM analysis.
     """
     logger.info(f"Incoming LLM request: {request.question[:50]}...")
+    store = _get_store(request.dataset)
     try:
-        if df.empty:
+        if store.is_empty:
             raise ValueError("No data available for analysis")
             
-        agent = MDCCapitalAgent(df, request.api_key)
-        response = agent.ask(request.question)
+        if request.session_id is None:
+            agent = _make_agent(store, request.api_key)
+            response = agent.ask(request.question)
+            _record_enrichment(store, agent)
+        else:
+            name = request.dataset or DEFAULT_DATASET
+            session = sessions.get(request.session_id)
+            with session.lock:
+                session.bind(name, store.epoch, store.version)
+                agent = _make_agent(store, request.api_key, session)
+                response = agent.ask(request.question)
+                _record_enrichment(store, agent)
+                session.stamp(name, store.epoch, store.version)
+            sessions.enforce_budget(keep=session)
         
         logger.info(f"Analysis complete. Response length: {len(response)} chars")
-        return {"response": response}
+        return {"response": response, "session_id": request.session_id}
     except Exception as e:
         logger.error(f"Request processing failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/batch")
+def ask_agent_batch(request: BatchQueryRequest):
+    """
+    Proxies a batch of questions to the MDCCapitalAgent, sharing planning,
+    execution and reporting across the batch.
+    """
+    logger.info(f"Incoming batch LLM request: {len(request.questions)} questions")
+    store = _get_store(request.dataset)
+    try:
+        if store.is_empty:
+            raise ValueError("No data available for analysis")
+        if not request.questions:
+            raise ValueError("No questions provided")
+        if len(request.questions) > MAX_BATCH_QUESTIONS:
+            raise ValueError(f"Batch exceeds the limit of {MAX_BATCH_QUESTIONS} questions")
+            
+        agent = _make_agent(store, request.api_key)
+        responses = agent.ask_batch(request.questions)
+        _record_enrichment(store, agent)
+        
+        logger.info(f"Batch analysis complete. {len(responses)} responses generated")
+        return {"responses": responses}
+    except Exception as e:
+        logger.error(f"Batch request processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/enrich")
+def enrich_dataset(request: EnrichRequest):
+    """
+    Re-runs enrichment for every unlabeled row, including rows that used up
+    their automatic retries.
+    """
+    store = _get_store(request.dataset)
+    if store.engine is not None:
+        raise HTTPException(status_code=400, detail="Out-of-core datasets are read-only")
+    try:
+        agent = _make_agent(store, request.api_key)
+        # A bulk job: interactive questions are served ahead of its LLM calls
+        agent.enrich(retry_exhausted=True, priority=BACKGROUND)
+        _record_enrichment(store, agent)
+        return {"enriched": len(agent.enriched_positions), "unenriched": len(agent.unenriched_positions)}
+    except Exception as e:
+        logger.error(f"Enrichment re-run failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     # In production, this would be handled by a runner like gunicorn
@@ -0,0 +1,287 @@
+import os
+import glob
+import json
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Iterable, Tuple, Dict, Any, Callable, List
+
+import numpy as np
+import pandas as pd
+
+from ..utils import get_data_summary, get_chart_aggregates
+from ..indexes import FrameIndex
+
+logger = logging.getLogger("MDCCapital.Store")
+
+# Execution backends a dataset can be served with
+BACKENDS = ("pandas", "duckdb")
+# Rows returned by /data for out-of-core datasets, which may not fit in memory
+DUCKDB_DATA_ROW_LIMIT = 10_000
+# Optional per-dataset configuration file inside the data directory
+MANIFEST_FILE = "datasets.json"
+
+class DatasetStore:
+    """
+    Holds the served dataset (in memory, pandas backend) together with its
+    version bookkeeping.
+
+    Every mutation bumps `version` and stamps the touched rows with it, so
+    clients can ask for only the rows changed since the version they hold.
+    `epoch` identifies one load of the data; a client holding a different
+    epoch (e.g. after a server restart) must resynchronize fully. Derived
+    payloads (summaries, chart aggregates) are cached for the current version.
+    """
+
+    backend = "pandas"
+    engine = None
+
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        self._lock = threading.Lock()
+        # Held by agents while they label rows of this frame in place
+        self.enrichment_lock = threading.Lock()
+        self.load(pd.DataFrame() if df is None else df)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.df.empty
+
+    @property
+    def record_count(self) -> int:
+        return len(self.df)
+
+    def summary(self) -> Dict[str, Any]:
+        return self.cached("summary", get_data_summary)
+
+    def aggregates(self) -> Dict[str, Any]:
+        return self.cached("aggregates", get_chart_aggregates)
+
+    def frame(self) -> pd.DataFrame:
+        """The rows served by /data."""
+        return self.df
+
+    def index(self) -> FrameIndex:
+        """Inverted and sorted indexes for the current dataset version."""
+        return self.cached("index", FrameIndex)
+
+    def filtered(self, filters: Dict[str, Any]) -> pd.DataFrame:
+        """Rows matching the given filters, resolved through the indexes."""
+        return self.df.iloc[self.index().positions(**filters)]
+
+    def load(self, df: pd.DataFrame) -> None:
+        """Replaces the dataset, starting a new epoch."""
+        with self._lock:
+            self.df = df
+            self.epoch = uuid.uuid4().hex[:12]
+            self.version = 1
+            self.row_versions = np.full(len(df), self.version, dtype=np.int64)
+            self._columns = tuple(df.columns)
+            self._cache: Dict[str, Any] = {}
+            self.memory_bytes = int(df.memory_usage(deep=True).sum())
+            # Failed enrichment runs per row position
+            self.enrichment_attempts: Dict[int, int] = {}
+
+    def mark_changed(self, positions: Optional[Iterable[int]] = None) -> int:
+        """
+        Records a mutation of the rows at the given positions (all rows if None)
+        and returns the new dataset version.
+        """
+        with self._lock:
+            self.version += 1
+            if len(self.row_versions) != len(self.df):
+                # Rows were appended in place; new rows are part of this change
+                grown = np.full(len(self.df), self.version, dtype=np.int64)
+                grown[:len(self.row_versions)] = self.row_versions
+                self.row_versions = grown
+            if positions is None or tuple(self.df.columns) != self._columns:
+                # A schema change touches every row
+                self.row_versions[:] = self.version
+            else:
+                self.row_versions[np.fromiter(positions, dtype=np.int64)] = self.version
+            self._columns = tuple(self.df.columns)
+            self._cache = {}
+            self.memory_bytes = int(self.df.memory_usage(deep=True).sum())
+            logger.info(f"Dataset version advanced to {self.version}")
+            return self.version
+
+    def changed_since(self, since: int, epoch: Optional[str] = None) -> Tuple[bool, pd.DataFrame]:
+        """
+        Returns (full, rows): the rows changed after version `since`, or the
+        whole frame with full=True when the client state cannot be patched.
+        """
+        with self._lock:
+            if epoch != self.epoch or since <= 0 or since > self.version:
+                return True, self.df
+            return False, self.df.iloc[np.flatnonzero(self.row_versions > since)]
+
+    def cached(self, key: str, builder: Callable[[pd.DataFrame], Any]) -> Any:
+        """Returns `builder(df)` memoized for the current dataset version."""
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = builder(self.df)
+            return self._cache[key]
+
+class DuckDBDatasetStore(DatasetStore):
+    """
+    A read-only dataset served out of core: queries run in DuckDB over Parquet
+    files on disk and nothing but query results is held in memory.
+    """
+
+    backend = "duckdb"
+
+    def __init__(self, engine):
+        self.engine = engine
+        super().__init__(pd.DataFrame())
+
+    @property
+    def is_empty(self) -> bool:
+        return self.engine.row_count == 0
+
+    @property
+    def record_count(self) -> int:
+        return self.engine.row_count
+
+    def summary(self) -> Dict[str, Any]:
+        return self.cached("summary", lambda _: self.engine.summary())
+
+    def aggregates(self) -> Dict[str, Any]:
+        return self.cached("aggregates", lambda _: self.engine.chart_aggregates())
+
+    def frame(self) -> pd.DataFrame:
+        return self.engine.query(f"SELECT * FROM df LIMIT {DUCKDB_DATA_ROW_LIMIT}")
+
+    def index(self) -> None:
+        # Filters are pushed down into the Parquet scan instead
+        return None
+
+    def filtered(self, filters: Dict[str, Any]) -> pd.DataFrame:
+        return self.engine.filtered(filters, DUCKDB_DATA_ROW_LIMIT)
+
+    def changed_since(self, since: int, epoch: Optional[str] = None) -> Tuple[bool, pd.DataFrame]:
+        # The Parquet files are immutable: only a new epoch needs a resync
+        if epoch != self.epoch or since <= 0 or since > self.version:
+            return True, self.frame()
+        return False, self.frame().iloc[:0]
+
+@dataclass
+class DatasetSource:
+    """Where a named dataset lives and which backend serves it."""
+    path: str
+    backend: str = "pandas"
+
+def discover_datasets(data_dir: str) -> Dict[str, DatasetSource]:
+    """
+    Maps dataset names to CSV/Parquet files under `data_dir`. Names are the
+    file paths relative to `data_dir` without extension (e.g. "ortho/2026-09").
+    Entries in `datasets.json` add datasets or override the discovered ones:
+        {"history": {"path": "history/*.parquet", "backend": "duckdb"}}
+    """
+    sources = {}
+    for root, _, files in os.walk(data_dir):
+        for file_name in sorted(files):
+            if file_name.endswith((".csv", ".parquet")):
+                path = os.path.join(root, file_name)
+                name = os.path.splitext(os.path.relpath(path, data_dir))[0].replace(os.sep, "/")
+                sources[name] = DatasetSource(path)
+
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for name, entry in manifest.items():
+            backend = entry.get("backend", "pandas")
+            if backend not in BACKENDS:
+                logger.error(f"Dataset '{name}' skipped: unknown backend '{backend}'")
+                continue
+            path = entry.get("path", sources[name].path if name in sources else "")
+            path = os.path.join(data_dir, path)
+            # Files that make up a configured dataset are not served on their own
+            members = set(glob.glob(path))
+            for other in [n for n, src in sources.items() if src.path in members and n != name]:
+                del sources[other]
+            sources[name] = DatasetSource(path, backend)
+    return sources
+
+class DatasetRegistry:
+    """
+    Named datasets, each with its own DatasetStore (and therefore its own
+    version, enrichment state and caches). Datasets are loaded on first use
+    and evicted least-recently-used once the loaded frames exceed the
+    memory budget; the most recently used dataset is always kept.
+    """
+
+    def __init__(self, sources: Dict[str, DatasetSource], default: str, memory_budget_bytes: int,
+                 loader: Callable[[str], pd.DataFrame]):
+        self.sources = dict(sources)
+        self.default = default
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader
+        self._stores: "OrderedDict[str, DatasetStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per dataset while it loads, so a cold load never blocks the others
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def names(self) -> List[str]:
+        return sorted(self.sources)
+
+    def get(self, name: Optional[str] = None) -> DatasetStore:
+        """
+        Returns the store for `name` (the default dataset if None), loading it
+        if needed. Raises KeyError for unknown dataset names. The registry lock
+        is not held during a load: concurrent callers for the same dataset wait
+        for that one load, callers for other datasets are not held up.
+        """
+        name = name or self.default
+        if name not in self.sources:
+            raise KeyError(name)
+        with self._lock:
+            store = self._stores.get(name)
+            if store is not None:
+                self._stores.move_to_end(name)
+                return store
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            with self._lock:
+                store = self._stores.get(name)
+            if store is None:
+                store = self._open(self.sources[name])
+                logger.info(f"Dataset '{name}' loaded ({store.memory_bytes / 2**20:.1f} MiB)")
+            with self._lock:
+                self._stores[name] = store
+                self._stores.move_to_end(name)
+                self._evict()
+                self._loading.pop(name, None)
+            return store
+
+    def _open(self, source: DatasetSource) -> DatasetStore:
+        if source.backend == "duckdb":
+            from ..query_engine import DuckDBEngine
+            return DuckDBDatasetStore(DuckDBEngine(source.path))
+        return DatasetStore(self._loader(source.path))
+
+    def _evict(self) -> None:
+        """Drops least-recently-used datasets until the budget is met."""
+        while len(self._stores) > 1 and self.memory_usage() > self.memory_budget_bytes:
+            name, store = self._stores.popitem(last=False)
+            logger.info(f"Dataset '{name}' evicted ({store.memory_bytes / 2**20:.1f} MiB)")
+
+    def memory_usage(self) -> int:
+        return sum(store.memory_bytes for store in self._stores.values())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Lists every known dataset with its load state."""
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "default": name == self.default,
+                    "backend": self.sources[name].backend,
+                    "loaded": name in self._stores,
+                    "records": self._stores[name].record_count if name in self._stores else None,
+                    "memory_bytes": self._stores[name].memory_bytes if name in self._stores else None,
+                }
+                for name in self.names()
+            ]
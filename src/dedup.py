@@ -0,0 +1,112 @@
+import re
+import zlib
+import logging
+from typing import List, Dict, Set
+
+import numpy as np
+
+logger = logging.getLogger("MDCCapital.Dedup")
+
+# MinHash / LSH parameters: 64 permutations split into 16 bands of 4 rows
+NUM_PERM = 64
+NUM_BANDS = 16
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.9
+_MERSENNE_PRIME = (1 << 31) - 1
+
+# Masks applied before comparison, most specific first
+_MASKS = [
+    (re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?"), "<amount>"),
+    (re.compile(r"\b\d{1,4}[/-]\d{1,2}[/-]\d{1,4}\b"), "<date>"),
+    (re.compile(r"#\s?[\w-]*\d[\w-]*"), "<id>"),
+    (re.compile(r"\b[a-z]*\d[\w-]*\b"), "<num>"),
+]
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a communication text for duplicate detection by lowercasing
+    it and masking amounts, dates, claim/reference IDs and other numbers.
+    """
+    normalized = str(text).lower()
+    for pattern, token in _MASKS:
+        normalized = pattern.sub(token, normalized)
+    return " ".join(normalized.split())
+
+def _shingles(text: str) -> Set[int]:
+    """Hashes the character shingles of a normalized text to 32-bit ints."""
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {
+        zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8"))
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+def _minhash_signatures(texts: List[str], seed: int = 7) -> np.ndarray:
+    """Computes a (len(texts), NUM_PERM) MinHash signature matrix."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        hashes = np.fromiter(_shingles(text), dtype=np.uint64) % _MERSENNE_PRIME
+        signatures[row] = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+def cluster_texts(texts: List[str], threshold: float = SIMILARITY_THRESHOLD) -> List[int]:
+    """
+    Groups exact and near-duplicate texts.
+
+    Texts are normalized first, so copies that differ only in numbers or IDs
+    collapse into exact duplicates. The remaining distinct texts are compared
+    with MinHash signatures; LSH banding proposes candidate pairs, which are
+    merged when their estimated Jaccard similarity reaches `threshold`.
+
+    Args:
+        texts (List[str]): Raw communication texts.
+        threshold (float): Minimum estimated shingle similarity for a merge.
+
+    Returns:
+        List[int]: For every text, the index of its cluster representative
+                   (the first member of the cluster).
+    """
+    # Exact duplicates after normalization
+    normalized = [normalize_text(text) for text in texts]
+    first_seen: Dict[str, int] = {}
+    for idx, text in enumerate(normalized):
+        first_seen.setdefault(text, idx)
+    uniques = list(first_seen.values())
+
+    # Near duplicates among the distinct normalized texts (union-find over `uniques`)
+    parent = list(range(len(uniques)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if len(uniques) > 1:
+        signatures = _minhash_signatures([normalized[idx] for idx in uniques])
+        rows_per_band = NUM_PERM // NUM_BANDS
+        for band in range(NUM_BANDS):
+            buckets: Dict[bytes, List[int]] = {}
+            band_slice = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+            for i, key in enumerate(band_slice):
+                buckets.setdefault(key.tobytes(), []).append(i)
+            for members in buckets.values():
+                for other in members[1:]:
+                    root_a, root_b = find(members[0]), find(other)
+                    if root_a == root_b:
+                        continue
+                    similarity = float(np.mean(signatures[members[0]] == signatures[other]))
+                    if similarity >= threshold:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # The smallest original index in each cluster is its representative
+    representative_of_unique = [uniques[find(i)] for i in range(len(uniques))]
+    unique_position = {idx: pos for pos, idx in enumerate(uniques)}
+    return [
+        representative_of_unique[unique_position[first_seen[text]]]
+        for text in normalized
+    ]
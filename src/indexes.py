@@ -0,0 +1,97 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("MDCCapital.Indexes")
+
+# Columns with an inverted index (value -> row positions)
+INVERTED_COLUMNS = ("insurer_name", "claim_status", "direction", "urgency")
+# Columns with a sorted index for range lookups
+SORTED_COLUMNS = ("days_since_submission", "urgency")
+
+class FrameIndex:
+    """
+    Precomputed lookups over one version of a frame, so selective filters
+    cost O(matches) instead of a boolean-mask scan over every row.
+
+    - Inverted indexes map each value of a categorical column to the sorted
+      array of row positions holding it.
+    - Sorted indexes keep a column's values in order together with their row
+      positions, so ranges are two binary searches.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.row_count = len(df)
+        self._inverted: Dict[str, Dict[Any, np.ndarray]] = {
+            col: {value: positions.astype(np.int64) for value, positions in df.groupby(col, sort=False).indices.items()}
+            for col in INVERTED_COLUMNS if col in df.columns
+        }
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for col in SORTED_COLUMNS:
+            if col in df.columns:
+                values = df[col].to_numpy()
+                present = np.flatnonzero(pd.notna(values))
+                order = present[np.argsort(values[present], kind="stable")]
+                self._sorted[col] = (values[order], order.astype(np.int64))
+        logger.info(f"Indexes built over {self.row_count} rows: "
+                    f"inverted={list(self._inverted)}, sorted={list(self._sorted)}")
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(list(self._inverted) + list(self._sorted)))
+
+    def lookup(self, column: str, *values: Any) -> np.ndarray:
+        """Row positions where `column` equals any of `values` (ascending)."""
+        if column not in self._inverted:
+            raise KeyError(f"No inverted index on '{column}'. Indexed: {list(self._inverted)}")
+        index = self._inverted[column]
+        hits = [index[value] for value in values if value in index]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        if len(hits) == 1:
+            return hits[0]
+        return np.sort(np.concatenate(hits))
+
+    def between(self, column: str, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """Row positions where low <= `column` <= high (either bound optional), ascending."""
+        if column not in self._sorted:
+            raise KeyError(f"No sorted index on '{column}'. Indexed: {list(self._sorted)}")
+        values, order = self._sorted[column]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return np.sort(order[start:stop])
+
+    def positions(self, **filters: Any) -> np.ndarray:
+        """
+        Row positions matching every filter. A scalar or list/set value is an
+        equality lookup; a (low, high) tuple is an inclusive range, e.g.
+        positions(insurer_name="Aetna", days_since_submission=(30, None)).
+        """
+        matches = []
+        for column, condition in filters.items():
+            if isinstance(condition, tuple):
+                matches.append(self.between(column, *condition))
+            elif isinstance(condition, (list, set, frozenset)):
+                matches.append(self.lookup(column, *condition))
+            else:
+                matches.append(self.lookup(column, condition))
+        if not matches:
+            return np.arange(self.row_count, dtype=np.int64)
+
+        # Intersect smallest-first so the work is bounded by the most selective filter
+        matches.sort(key=len)
+        result = matches[0]
+        for other in matches[1:]:
+            if len(result) == 0:
+                break
+            result = result[np.isin(result, other, assume_unique=True)]
+        return result
+
+def index_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops unset filters (None or empty lists) from a filter mapping."""
+    return {
+        column: condition for column, condition in filters.items()
+        if condition is not None and condition != [] and condition != (None, None)
+    }
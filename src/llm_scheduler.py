@@ -0,0 +1,185 @@
+import os
+import time
+import heapq
+import hashlib
+import logging
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("MDCCapital.LLMScheduler")
+
+# Priority classes; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Per-key pacing: sustained requests per minute, burst size and concurrent calls
+REQUESTS_PER_MINUTE = float(os.environ.get("MDC_LLM_RPM", "60"))
+BURST = float(os.environ.get("MDC_LLM_BURST", "10"))
+MAX_IN_FLIGHT = int(os.environ.get("MDC_LLM_CONCURRENCY", "4"))
+# Tokens background calls must leave in the bucket, so interactive calls never queue behind them
+BACKGROUND_RESERVE = float(os.environ.get("MDC_LLM_BACKGROUND_RESERVE", "2"))
+# Characters per prompt token, used for quota accounting
+CHARS_PER_TOKEN = 4
+
+def _is_rate_limited(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}"
+    return "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text
+
+class _KeyState:
+    """Token bucket, wait queue and usage counters for one API key."""
+
+    def __init__(self, rate_per_sec: float, burst: float):
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting: List[Tuple[int, int]] = []  # heap of (priority, ticket)
+        self.in_flight = 0
+        self.calls = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_ms = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class LLMScheduler:
+    """
+    Process-wide gate for LLM calls. Every call waits for a slot on its API
+    key: callers are served in priority order (interactive before background,
+    FIFO within a class), paced by a per-key token bucket and capped in
+    concurrency. Background calls (bulk enrichment re-runs) only spend tokens
+    above a reserve, so they use spare capacity without delaying questions.
+    """
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE, burst: float = BURST,
+                 max_in_flight: int = MAX_IN_FLIGHT, background_reserve: float = BACKGROUND_RESERVE):
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(burst, 1.0)
+        self.max_in_flight = max(max_in_flight, 1)
+        self.background_reserve = min(background_reserve, self.burst - 1)
+        self._keys: Dict[str, _KeyState] = {}
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def key_id(api_key: str) -> str:
+        """Stable, non-reversible label for an API key (used in metrics and logs)."""
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+    def _state(self, key: str) -> _KeyState:
+        if key not in self._keys:
+            self._keys[key] = _KeyState(self.rate, self.burst)
+        return self._keys[key]
+
+    def _acquire(self, key: str, priority: int) -> float:
+        """Blocks until this caller may call the API; returns the time waited (ms)."""
+        started = time.monotonic()
+        with self._condition:
+            state = self._state(key)
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(state.waiting, ticket)
+            while True:
+                now = time.monotonic()
+                state.refill(now)
+                needed = 1 + (self.background_reserve if priority != INTERACTIVE else 0)
+                if state.waiting[0] == ticket and state.in_flight < self.max_in_flight and state.tokens >= needed:
+                    heapq.heappop(state.waiting)
+                    state.tokens -= 1
+                    state.in_flight += 1
+                    # The next waiter may be able to go too
+                    self._condition.notify_all()
+                    break
+                timeout = None
+                if state.tokens < needed and state.rate > 0:
+                    timeout = (needed - state.tokens) / state.rate
+                self._condition.wait(timeout)
+        return (time.monotonic() - started) * 1000
+
+    def _release(self, key: str) -> None:
+        with self._condition:
+            self._keys[key].in_flight -= 1
+            self._condition.notify_all()
+
+    def invoke(self, client: Any, prompt: str, api_key: str, priority: int = INTERACTIVE) -> Any:
+        """Runs `client.invoke(prompt)` once a slot for `api_key` is available."""
+        return self.run(lambda: client.invoke(prompt), api_key, priority, prompt_chars=len(prompt))
+
+    def run(self, call: Callable[[], Any], api_key: str, priority: int = INTERACTIVE, prompt_chars: int = 0) -> Any:
+        """Runs an arbitrary API call under the scheduler."""
+        key = self.key_id(api_key)
+        name = PRIORITY_NAMES[priority]
+        waited_ms = self._acquire(key, priority)
+        if waited_ms > 1000:
+            logger.info(f"{name} LLM call on key {key} queued for {waited_ms:.0f} ms")
+        try:
+            response = call()
+        except Exception as e:
+            with self._condition:
+                state = self._keys[key]
+                state.errors += 1
+                if _is_rate_limited(e):
+                    # The provider's quota is exhausted: drain the bucket so callers back off
+                    state.rate_limited += 1
+                    state.tokens = min(state.tokens, 0.0)
+                    logger.warning(f"LLM quota exhausted on key {key}; pacing subsequent calls")
+            raise
+        finally:
+            self._release(key)
+
+        content = getattr(response, "content", "")
+        with self._condition:
+            state = self._keys[key]
+            state.calls[name] += 1
+            state.wait_ms[name] += waited_ms
+            state.prompt_tokens += prompt_chars // CHARS_PER_TOKEN
+            state.response_tokens += len(str(content)) // CHARS_PER_TOKEN
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, in-flight calls, remaining bucket and usage per API key."""
+        with self._condition:
+            now = time.monotonic()
+            keys = {}
+            for key, state in self._keys.items():
+                state.refill(now)
+                depth = {name: 0 for name in PRIORITY_NAMES.values()}
+                for priority, _ in state.waiting:
+                    depth[PRIORITY_NAMES[priority]] += 1
+                keys[key] = {
+                    "queue_depth": depth,
+                    "in_flight": state.in_flight,
+                    "tokens_available": round(state.tokens, 2),
+                    "calls": dict(state.calls),
+                    "avg_wait_ms": {
+                        name: round(state.wait_ms[name] / state.calls[name], 1) if state.calls[name] else 0.0
+                        for name in state.calls
+                    },
+                    "estimated_prompt_tokens": state.prompt_tokens,
+                    "estimated_response_tokens": state.response_tokens,
+                    "errors": state.errors,
+                    "rate_limited": state.rate_limited,
+                }
+            return {
+                "requests_per_minute": self.rate * 60,
+                "burst": self.burst,
+                "max_in_flight": self.max_in_flight,
+                "background_reserve": self.background_reserve,
+                "keys": keys,
+            }
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    """The process-wide scheduler shared by all agents."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
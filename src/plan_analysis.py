@@ -0,0 +1,413 @@
+import ast
+import copy
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Dict, Tuple
+
+# Relative cost of one Python-level row visit versus one vectorized row visit
+PYTHON_ROW_COST = 50
+# Assumed number of iterations of a loop over group keys (e.g. `.unique()`)
+GROUP_LOOP_ITERATIONS = 10
+
+# Expression kinds, by how many iterations looping over them takes. "row" values are
+# row-sized sequences (a column, the index, row tuples); "frame" values are row-sized
+# DataFrames, whose iteration visits columns; "group" values hold one entry per group.
+_KIND_RANK = {"plain": 0, "group": 1, "frame": 2, "row": 3}
+
+# Frame/Series methods whose result has one entry per group
+_GROUP_RESULTS = {"unique", "value_counts", "groupby", "drop_duplicates", "pivot_table", "resample"}
+# Methods whose result has a small, fixed size
+_BOUNDED_RESULTS = {"head", "tail", "nlargest", "nsmallest", "sample"}
+# Reductions to a scalar (or one value per column)
+_SCALAR_RESULTS = {"sum", "mean", "median", "min", "max", "count", "nunique", "std", "var", "any",
+                   "all", "idxmax", "idxmin", "item", "corr", "quantile"}
+# Attributes describing columns or shape rather than rows
+_COLUMN_ATTRIBUTES = {"columns", "dtypes", "shape", "size", "ndim", "empty", "name", "dtype"}
+# Methods that expose a frame's rows as a sequence
+_ROW_METHODS = {"tolist", "to_list", "to_numpy", "to_records"}
+_ROW_ITERATORS = {"iterrows", "itertuples"}
+# DataFrame.to_dict orients that yield one entry per row (the others are keyed by column)
+_ROW_ORIENTS = {"records", "index"}
+# Builtins whose result iterates like their arguments
+_PASS_THROUGH_BUILTINS = {"zip", "enumerate", "list", "tuple", "set", "sorted", "reversed", "iter", "map", "filter"}
+
+def _widest(kinds) -> Optional[str]:
+    kinds = [k for k in kinds if k is not None]
+    return max(kinds, key=_KIND_RANK.get) if kinds else None
+
+@dataclass
+class PlanFinding:
+    """A single anti-pattern detected in a generated plan."""
+    rule: str
+    line: int
+    message: str
+    blocking: bool = True
+
+@dataclass
+class PlanAnalysis:
+    """Static findings and a rough cost model for one generated plan."""
+    findings: List[PlanFinding] = field(default_factory=list)
+    scans: int = 0
+    row_passes: int = 0
+    group_scans: int = 0
+    quadratic: bool = False
+    parse_error: Optional[str] = None
+
+    @property
+    def complexity(self) -> str:
+        if self.quadratic:
+            return "O(n^2)"
+        if self.group_scans:
+            return "O(k*n)"
+        return "O(n)"
+
+    @property
+    def blocking(self) -> bool:
+        """True when the plan contains row-wise patterns that should not run as-is."""
+        return any(f.blocking for f in self.findings)
+
+    def estimated_cost(self, rows: int) -> int:
+        """Estimated vectorized-row-equivalent operations for a frame of `rows` rows."""
+        cost = self.scans * rows
+        cost += self.row_passes * rows * PYTHON_ROW_COST
+        cost += self.group_scans * GROUP_LOOP_ITERATIONS * rows
+        if self.quadratic:
+            cost += rows * rows
+        return cost
+
+    def feedback(self) -> str:
+        """Targeted feedback for re-prompting the planner."""
+        return "\n".join(f"- Line {f.line}: {f.message}" for f in self.findings)
+
+class _PlanVisitor(ast.NodeVisitor):
+    """Collects anti-patterns and scan counts, tracking names derived from `df`."""
+
+    def __init__(self):
+        self.analysis = PlanAnalysis()
+        self.kinds: Dict[str, str] = {"df": "frame"}
+        self.loop_stack: List[str] = []  # "row", "group" or "plain" per enclosing loop
+        self.contains_calls: Dict[str, List[int]] = {}
+
+    def _uses_frame(self, node: ast.AST) -> bool:
+        """True when the expression touches row-sized data derived from `df`."""
+        return any(isinstance(n, ast.Name) and self.kinds.get(n.id) in ("frame", "row") for n in ast.walk(node))
+
+    def _is_row_count(self, node: ast.AST) -> bool:
+        """Matches `len(<frame>)` and `<frame>.shape[0]`."""
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "len" and node.args:
+            return self._kind(node.args[0]) in ("frame", "row")
+        return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute)
+                and node.value.attr == "shape" and self._kind(node.value.value) in ("frame", "row"))
+
+    def _kind(self, node: ast.AST) -> Optional[str]:
+        """
+        Classifies an expression derived from `df` as "row", "frame", "group"
+        or "plain"; None when it does not involve the frame at all.
+        """
+        if isinstance(node, ast.Name):
+            return self.kinds.get(node.id)
+        if isinstance(node, ast.Attribute):
+            base = self._kind(node.value)
+            if base in (None, "plain", "group"):
+                return base
+            if node.attr in _COLUMN_ATTRIBUTES:
+                return "plain"
+            if base == "frame" and node.attr not in ("loc", "iloc", "T"):
+                # df.index, df.values and df.<column> are row sequences
+                return "row"
+            return base
+        if isinstance(node, ast.Subscript):
+            base = self._kind(node.value)
+            if base != "frame":
+                return base
+            key = node.slice.elts[-1] if isinstance(node.slice, ast.Tuple) and node.slice.elts else node.slice
+            # A single column label selects a Series; masks and column lists keep a frame
+            return "row" if isinstance(key, ast.Constant) and isinstance(key.value, str) else "frame"
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                if node.func.id == "range":
+                    return "row" if any(self._is_row_count(arg) for arg in node.args) else "plain"
+                if node.func.id in _PASS_THROUGH_BUILTINS:
+                    return _widest(self._kind(arg) for arg in node.args)
+                return "plain" if any(self._kind(arg) for arg in node.args) else None
+            if isinstance(node.func, ast.Attribute):
+                base = self._kind(node.func.value)
+                method = node.func.attr
+                if base is None:
+                    # e.g. pd.concat([...]) or np.where(mask, ...): as wide as its inputs
+                    return _widest([self._kind(arg) for arg in node.args] +
+                                   [self._kind(kw.value) for kw in node.keywords])
+                if base == "plain" or method in _BOUNDED_RESULTS:
+                    return "plain"
+                if base == "group":
+                    # Aggregating a group result keeps one entry per group
+                    return "group"
+                if method in _SCALAR_RESULTS:
+                    return "plain"
+                if method in _GROUP_RESULTS:
+                    return "group"
+                if method in _ROW_ITERATORS or method in _ROW_METHODS:
+                    return "row"
+                if method == "to_dict":
+                    if base != "frame":
+                        return "row"
+                    orient = node.args[0] if node.args else next(
+                        (kw.value for kw in node.keywords if kw.arg == "orient"), None)
+                    is_row_orient = isinstance(orient, ast.Constant) and orient.value in _ROW_ORIENTS
+                    return "row" if is_row_orient else "plain"
+                if method in ("items", "keys"):
+                    # DataFrame.items()/keys() yield columns, the Series versions yield rows
+                    return "plain" if base == "frame" else "row"
+                return base
+            return None
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return _widest(self._kind(elt) for elt in node.elts)
+        if isinstance(node, ast.BinOp):
+            return _widest([self._kind(node.left), self._kind(node.right)])
+        if isinstance(node, ast.Compare):
+            return _widest([self._kind(node.left)] + [self._kind(c) for c in node.comparators])
+        if isinstance(node, ast.BoolOp):
+            return _widest(self._kind(v) for v in node.values)
+        if isinstance(node, ast.UnaryOp):
+            return self._kind(node.operand)
+        return None
+
+    def _count_scan(self):
+        if "row" in self.loop_stack:
+            self.analysis.quadratic = True
+        elif "group" in self.loop_stack:
+            self.analysis.group_scans += 1
+        else:
+            self.analysis.scans += 1
+
+    def _classify_loop(self, iterable: ast.AST, lineno: int) -> str:
+        """Classifies a loop by what it iterates over, recording row-wise findings."""
+        kind = self._kind(iterable)
+        if kind == "group":
+            return "group"
+        if kind != "row":
+            # Columns, bounded results (head/nlargest) and plain Python data
+            return "plain"
+        method = None
+        if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Attribute):
+            method = iterable.func.attr
+        if method in _ROW_ITERATORS:
+            self.analysis.findings.append(PlanFinding(
+                "row-iteration", lineno,
+                f"`.{method}()` visits rows one at a time in Python; use vectorized column "
+                "operations, boolean masks or groupby/agg instead.",
+            ))
+        else:
+            self.analysis.findings.append(PlanFinding(
+                "python-loop", lineno,
+                "Python loop over DataFrame rows; replace it with vectorized column "
+                "operations or groupby/agg.",
+            ))
+        self.analysis.row_passes += 1
+        if "row" in self.loop_stack:
+            self.analysis.quadratic = True
+        return "row"
+
+    def visit_Assign(self, node: ast.Assign):
+        self.visit(node.value)
+        kind = self._kind(node.value)
+        for target in node.targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name):
+                    if kind is None:
+                        self.kinds.pop(name.id, None)
+                    else:
+                        self.kinds[name.id] = kind
+
+    def visit_For(self, node: ast.For):
+        self.visit(node.iter)
+        self.loop_stack.append(self._classify_loop(node.iter, node.lineno))
+        for child in node.body + node.orelse:
+            self.visit(child)
+        self.loop_stack.pop()
+
+    def _visit_comprehension(self, node):
+        kinds = []
+        for generator in node.generators:
+            self.visit(generator.iter)
+            kinds.append(self._classify_loop(generator.iter, node.lineno))
+        self.loop_stack.extend(kinds)
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, ast.comprehension):
+                self.visit(child)
+        for generator in node.generators:
+            for condition in generator.ifs:
+                self.visit(condition)
+        del self.loop_stack[len(self.loop_stack) - len(kinds):]
+
+    visit_ListComp = _visit_comprehension
+    visit_SetComp = _visit_comprehension
+    visit_DictComp = _visit_comprehension
+    visit_GeneratorExp = _visit_comprehension
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Attribute) and self._uses_frame(node.func.value):
+            method = node.func.attr
+            self._count_scan()
+            axis = next((kw.value for kw in node.keywords if kw.arg == "axis"), None)
+            if method == "apply" and isinstance(axis, ast.Constant) and axis.value in (1, "columns"):
+                self.analysis.row_passes += 1
+                self.analysis.findings.append(PlanFinding(
+                    "row-apply", node.lineno,
+                    "`.apply(..., axis=1)` calls a Python function per row; compute the "
+                    "expression on whole columns instead (e.g. df['a'] - df['b'], np.where).",
+                ))
+            if method == "contains" and isinstance(node.func.value, ast.Attribute) and node.func.value.attr == "str":
+                key = ast.dump(node.func.value.value)
+                self.contains_calls.setdefault(key, []).append(node.lineno)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript):
+        if (isinstance(node.ctx, ast.Load) and isinstance(node.slice, (ast.Compare, ast.BinOp, ast.BoolOp, ast.UnaryOp))
+                and self._uses_frame(node.value)):
+            # Boolean-mask filtering
+            self._count_scan()
+        self.generic_visit(node)
+
+    def finish(self) -> PlanAnalysis:
+        for lines in self.contains_calls.values():
+            if len(lines) > 1:
+                self.analysis.findings.append(PlanFinding(
+                    "repeated-str-contains", lines[1],
+                    f"`.str.contains` scans the same column {len(lines)} times; combine the "
+                    "patterns into one regex alternation (e.g. 'a|b').",
+                    blocking=False,
+                ))
+        return self.analysis
+
+def analyze_plan(code: str) -> PlanAnalysis:
+    """
+    Statically analyzes generated pandas code for row-wise anti-patterns
+    (`iterrows`, `apply(axis=1)`, Python loops over frame data, repeated
+    `.str.contains` scans) and estimates its cost.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return PlanAnalysis(parse_error=str(e))
+    visitor = _PlanVisitor()
+    visitor.visit(tree)
+    return visitor.finish()
+
+# --- Rewrites ---------------------------------------------------------------
+
+_VECTORIZABLE_NODES = (ast.BinOp, ast.UnaryOp, ast.Compare, ast.Constant, ast.Subscript,
+                       ast.operator, ast.unaryop, ast.cmpop, ast.Name, ast.Load, ast.expr_context)
+# Operators that mean the same element-wise on Series as on scalars. Identity and
+# membership tests (is, in) and logical/bitwise negation (not, ~) do not.
+_ELEMENTWISE_COMPARISONS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+_ELEMENTWISE_UNARY = (ast.UAdd, ast.USub)
+
+def _vectorize_row_apply(node: ast.Call) -> Optional[ast.AST]:
+    """
+    Rewrites `frame.apply(lambda r: <arithmetic/comparison on r['col']>, axis=1)`
+    into the equivalent whole-column expression, or returns None.
+    """
+    if not node.args or not isinstance(node.args[0], ast.Lambda):
+        return None
+    if len(node.args) > 1 or any(kw.arg != "axis" for kw in node.keywords):
+        return None
+    func = node.args[0]
+    if len(func.args.args) != 1:
+        return None
+    param = func.args.args[0].arg
+    frame = node.func.value
+
+    if not any(isinstance(sub, ast.Subscript) for sub in ast.walk(func.body)):
+        # A body without column references is a constant; rewritten it would be a scalar, not a Series
+        return None
+    for sub in ast.walk(func.body):
+        if not isinstance(sub, _VECTORIZABLE_NODES):
+            return None
+        if isinstance(sub, ast.Compare) and (len(sub.ops) != 1 or not isinstance(sub.ops[0], _ELEMENTWISE_COMPARISONS)):
+            return None
+        if isinstance(sub, ast.UnaryOp) and not isinstance(sub.op, _ELEMENTWISE_UNARY):
+            return None
+        if isinstance(sub, ast.BinOp) and isinstance(sub.op, ast.MatMult):
+            return None
+        if isinstance(sub, ast.Constant) and sub.value is None:
+            # `== None` is a missing-value test per row but always False on a Series
+            return None
+        if isinstance(sub, ast.Name) and sub.id != param:
+            return None
+        if isinstance(sub, ast.Subscript):
+            if not (isinstance(sub.value, ast.Name) and sub.value.id == param
+                    and isinstance(sub.slice, ast.Constant) and isinstance(sub.slice.value, str)):
+                return None
+
+    class _ToColumns(ast.NodeTransformer):
+        def visit_Subscript(self, sub):
+            return ast.Subscript(value=copy.deepcopy(frame), slice=sub.slice, ctx=ast.Load())
+
+    body = _ToColumns().visit(copy.deepcopy(func.body))
+    if not isinstance(body, (ast.BinOp, ast.Compare, ast.UnaryOp)):
+        return None
+    return body
+
+def _contains_chain(node: ast.AST, op_type) -> Optional[List[ast.Call]]:
+    """Flattens `a | b | c` (or `&`) of `.str.contains(...)` calls on one receiver."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, op_type):
+        left = _contains_chain(node.left, op_type)
+        right = _contains_chain(node.right, op_type)
+        return left + right if left is not None and right is not None else None
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "contains"
+            and isinstance(node.func.value, ast.Attribute) and node.func.value.attr == "str"
+            and len(node.args) == 1 and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)):
+        return [node]
+    return None
+
+class _PlanRewriter(ast.NodeTransformer):
+    """Applies the known vectorizing rewrites."""
+
+    def __init__(self):
+        self.applied: List[str] = []
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        axis = next((kw.value for kw in node.keywords if kw.arg == "axis"), None)
+        if (isinstance(node.func, ast.Attribute) and node.func.attr == "apply"
+                and isinstance(axis, ast.Constant) and axis.value in (1, "columns")):
+            vectorized = _vectorize_row_apply(node)
+            if vectorized is not None:
+                self.applied.append("row-apply")
+                return vectorized
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp):
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.BitOr):
+            return node
+        calls = _contains_chain(node, ast.BitOr)
+        if not calls:
+            return node
+        receivers = {ast.dump(c.func.value.value) for c in calls}
+        keywords = {ast.dump(ast.List(elts=[ast.Tuple(elts=[ast.Constant(kw.arg), kw.value], ctx=ast.Load())
+                                           for kw in c.keywords], ctx=ast.Load())) for c in calls}
+        regex_off = any(kw.arg == "regex" and isinstance(kw.value, ast.Constant) and kw.value.value is False
+                        for c in calls for kw in c.keywords)
+        if len(receivers) != 1 or len(keywords) != 1 or regex_off:
+            return node
+        merged = copy.deepcopy(calls[0])
+        merged.args = [ast.Constant("|".join(f"(?:{c.args[0].value})" for c in calls))]
+        self.applied.append("repeated-str-contains")
+        return merged
+
+def rewrite_plan(code: str) -> Tuple[str, List[str]]:
+    """
+    Rewrites known row-wise patterns to vectorized equivalents. Returns the
+    new code and the names of the rewrites applied.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code, []
+    rewriter = _PlanRewriter()
+    tree = ast.fix_missing_locations(rewriter.visit(tree))
+    if not rewriter.applied:
+        return code, []
+    return ast.unparse(tree), rewriter.applied
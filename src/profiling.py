@@ -0,0 +1,91 @@
+"""
+Startup profiling: measures per-module import time for a cold interpreter.
+
+Usage:
+    python -m src.profiling src.api.server src.agent --top 20 --json startup.json --budget-ms 1500
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import logging
+import subprocess
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger("MDCCapital.Profiling")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# "import time:       self [us] |  cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+def profile_imports(module: str, python: str = sys.executable) -> List[Dict[str, Any]]:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime` and returns one
+    entry per imported module: name, nesting depth, self and cumulative time (ms).
+    """
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                "module": name,
+                "depth": (len(indent) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return entries
+
+def summarize(module: str, entries: List[Dict[str, Any]], top: int = 20) -> Dict[str, Any]:
+    """Total import time of `module` plus its most expensive top-level dependencies."""
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == module), 0.0)
+    heaviest = sorted(
+        (e for e in entries if e["depth"] <= 1 and e["module"] != module),
+        key=lambda e: e["cumulative_ms"],
+        reverse=True,
+    )
+    return {"module": module, "total_ms": total, "top": heaviest[:top]}
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """Renders a summary as a fixed-width text table."""
+    lines = [f"Import profile for {summary['module']}: {summary['total_ms']:.1f} ms total"]
+    for entry in summary["top"]:
+        lines.append(f"  {entry['cumulative_ms']:9.1f} ms  {entry['module']}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report per-module import time for cold starts.")
+    parser.add_argument("modules", nargs="*", default=["src.api.server"], help="Modules to import.")
+    parser.add_argument("--top", type=int, default=20, help="Number of heaviest imports to list.")
+    parser.add_argument("--json", dest="json_path", help="Write the summaries to this JSON file.")
+    parser.add_argument("--budget-ms", type=float, help="Exit non-zero if any module exceeds this total.")
+    args = parser.parse_args(argv)
+
+    summaries = [summarize(module, profile_imports(module), args.top) for module in args.modules]
+    for summary in summaries:
+        print(format_report(summary))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+    if args.budget_ms is not None:
+        over = [s for s in summaries if s["total_ms"] > args.budget_ms]
+        for summary in over:
+            print(f"REGRESSION: {summary['module']} took {summary['total_ms']:.1f} ms (budget {args.budget_ms:.1f} ms)")
+        return 1 if over else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, Optional, List
+
+import pandas as pd
+
+logger = logging.getLogger("MDCCapital.QueryEngine")
+
+# Resource limits for the embedded engine; DuckDB spills to disk beyond the memory limit
+DUCKDB_MEMORY_LIMIT = os.environ.get("MDC_DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_THREADS = os.environ.get("MDC_DUCKDB_THREADS")
+# Box-plot outliers returned per insurer by chart_aggregates()
+MAX_FLIERS = 100
+
+_GLOB_CHARACTERS = set("*?[{")
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _static_directory(path: str) -> str:
+    """The deepest directory of a file path or glob that contains no wildcards."""
+    parts = os.path.abspath(path).split(os.sep)
+    static = []
+    for part in parts[:-1]:
+        if _GLOB_CHARACTERS & set(part):
+            break
+        static.append(part)
+    return os.path.join(os.sep.join(static) or os.sep, "")
+
+class DuckDBEngine:
+    """
+    Out-of-core execution backend: runs SQL with an embedded DuckDB instance
+    over Parquet files on local disk, exposed as the view `df`. Queries get
+    predicate/projection pushdown into the Parquet scan, parallel aggregation
+    across cores and stream data larger than RAM (spilling under the memory limit).
+
+    Once the view exists the connection is locked down: only the dataset's
+    files (and the spill directory) are readable, all other file and network
+    access is disabled and the configuration can no longer be changed.
+    Generated queries go through `execute_plan`, which only accepts a single
+    SELECT statement.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The 'duckdb' backend requires the duckdb package (pip install duckdb)") from e
+
+        self._duckdb = duckdb
+        self.path = os.path.abspath(path)
+        self._connection = duckdb.connect()
+        self._connection.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+        if DUCKDB_THREADS:
+            self._connection.execute(f"SET threads = {int(DUCKDB_THREADS)}")
+        self._connection.execute(f"CREATE VIEW df AS SELECT * FROM read_parquet({_sql_literal(self.path)})")
+        self._lock_down()
+        self._lock = threading.Lock()
+        # Fixed for the engine's lifetime, like the files behind the view
+        self._row_count: Optional[int] = None
+        self._columns: Optional[Dict[str, str]] = None
+        self._schema: Optional[str] = None
+        logger.info(f"DuckDB engine attached to {path}")
+
+    def _lock_down(self) -> None:
+        """Confines the connection to the dataset files and freezes its configuration."""
+        temp_directory = self._connection.execute("SELECT current_setting('temp_directory')").fetchone()[0]
+        directories = [_static_directory(self.path)]
+        if temp_directory:
+            directories.append(os.path.join(os.path.abspath(temp_directory), ""))
+        if _GLOB_CHARACTERS & set(self.path):
+            self._connection.execute(f"SET allowed_directories = [{', '.join(map(_sql_literal, directories))}]")
+        else:
+            self._connection.execute(f"SET allowed_paths = [{_sql_literal(self.path)}]")
+            self._connection.execute(f"SET allowed_directories = [{', '.join(map(_sql_literal, directories[1:]))}]")
+        self._connection.execute("SET enable_external_access = false")
+        self._connection.execute("SET lock_configuration = true")
+
+    def execute_plan(self, sql: str) -> pd.DataFrame:
+        """
+        Runs a generated query. Anything but a single SELECT statement
+        (COPY, ATTACH, SET, DDL/DML, several statements) is rejected.
+        """
+        statements = self._duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != self._duckdb.StatementType.SELECT:
+            raise ValueError("Generated SQL must be a single read-only SELECT statement")
+        return self.query(sql)
+
+    def query(self, sql: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
+        """Runs a query on its own cursor (safe to call from several threads)."""
+        with self._lock:
+            cursor = self._connection.cursor()
+        try:
+            return cursor.execute(sql, params).df()
+        finally:
+            cursor.close()
+
+    @property
+    def row_count(self) -> int:
+        if self._row_count is None:
+            self._row_count = int(self.query("SELECT count(*) AS n FROM df")["n"].iloc[0])
+        return self._row_count
+
+    @property
+    def columns(self) -> Dict[str, str]:
+        if self._columns is None:
+            described = self.query("DESCRIBE df")
+            self._columns = dict(zip(described["column_name"], described["column_type"]))
+        return dict(self._columns)
+
+    def schema_description(self) -> str:
+        """
+        Column names, types and a few sample values for planner prompts, built
+        once per engine. Samples are the first non-null values rather than
+        DISTINCT ones, which would hash every column in full.
+        """
+        if self._schema is None:
+            schema_info = []
+            for col, dtype in self.columns.items():
+                sample = self.query(f'SELECT "{col}" AS v FROM df WHERE "{col}" IS NOT NULL LIMIT 3')["v"]
+                schema_info.append(f"- {col} ({dtype}): e.g., {sample.tolist()}")
+            self._schema = "\n".join(schema_info)
+        return self._schema
+
+    def summary(self) -> Dict[str, Any]:
+        """SQL counterpart of utils.get_data_summary."""
+        totals = self.query(
+            "SELECT count(*) AS n, avg(urgency) AS avg_urgency, avg(days_since_submission) AS avg_days FROM df"
+        ).iloc[0]
+        statuses = self.query("SELECT claim_status, count(*) AS n FROM df GROUP BY 1 ORDER BY 2 DESC")
+        insurers = self.query("SELECT DISTINCT insurer_name FROM df WHERE insurer_name IS NOT NULL")
+        return {
+            "total_records": int(totals["n"]),
+            "insurers": insurers["insurer_name"].tolist(),
+            "status_counts": dict(zip(statuses["claim_status"], statuses["n"].astype(int).tolist())),
+            "avg_urgency": float(totals["avg_urgency"]) if pd.notna(totals["avg_urgency"]) else 0.0,
+            "avg_days": float(totals["avg_days"]) if pd.notna(totals["avg_days"]) else 0.0,
+        }
+
+    def chart_aggregates(self) -> Dict[str, Any]:
+        """SQL counterpart of utils.get_chart_aggregates."""
+        statuses = self.query("SELECT claim_status, count(*) AS n FROM df GROUP BY 1")
+        boxes = self.query(f"""
+            WITH q AS (
+                SELECT insurer_name,
+                       quantile_cont(urgency, 0.25) AS q1,
+                       median(urgency) AS med,
+                       quantile_cont(urgency, 0.75) AS q3
+                FROM df WHERE urgency IS NOT NULL GROUP BY 1
+            )
+            SELECT insurer_name, any_value(q1) AS q1, any_value(med) AS med, any_value(q3) AS q3,
+                   min(urgency) FILTER (WHERE urgency >= q1 - 1.5 * (q3 - q1)) AS whislo,
+                   max(urgency) FILTER (WHERE urgency <= q3 + 1.5 * (q3 - q1)) AS whishi,
+                   coalesce(list_slice(list(urgency) FILTER (
+                       WHERE urgency < q1 - 1.5 * (q3 - q1) OR urgency > q3 + 1.5 * (q3 - q1)
+                   ), 1, {MAX_FLIERS}), []) AS fliers
+            FROM df JOIN q USING (insurer_name)
+            GROUP BY insurer_name
+        """)
+        aggregates: Dict[str, Any] = {
+            "status_counts": dict(zip(statuses["claim_status"], statuses["n"].astype(int).tolist())),
+            "urgency_by_insurer": {
+                row.insurer_name: {
+                    "q1": float(row.q1), "med": float(row.med), "q3": float(row.q3),
+                    "whislo": float(row.whislo), "whishi": float(row.whishi),
+                    "fliers": [float(v) for v in row.fliers],
+                }
+                for row in boxes.itertuples(index=False)
+            },
+            "category_counts": {},
+            "tone_counts": {},
+        }
+        if {"denial_category", "tone"} <= set(self.columns):
+            for key, col in (("category_counts", "denial_category"), ("tone_counts", "tone")):
+                counts = self.query(f"SELECT {col}, count(*) AS n FROM df WHERE {col} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC")
+                aggregates[key] = dict(zip(counts[col], counts["n"].astype(int).tolist()))
+        return aggregates
+
+    def filtered(self, filters: Dict[str, Any], limit: int) -> pd.DataFrame:
+        """
+        Rows matching FrameIndex-style filters (scalar/list equality, (low, high)
+        ranges), evaluated as a parameterized WHERE clause pushed into the scan.
+        """
+        clauses, params = [], []
+        known = self.columns
+        for column, condition in filters.items():
+            if column not in known:
+                raise KeyError(f"Unknown column '{column}'")
+            if isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    clauses.append(f'"{column}" >= ?')
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f'"{column}" <= ?')
+                    params.append(high)
+            else:
+                values = list(condition) if isinstance(condition, (list, set, frozenset)) else [condition]
+                clauses.append(f'"{column}" IN ({", ".join("?" for _ in values)})')
+                params.extend(values)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.query(f"SELECT * FROM df {where} LIMIT {int(limit)}", params)
@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger("MDCCapital.Sessions")
+
+# Memory shared by the intermediates of all sessions, and idle time before a session expires
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get("MDC_SESSION_MEMORY_MB", "256"))
+SESSION_TTL_SECONDS = int(os.environ.get("MDC_SESSION_TTL_SECONDS", "1800"))
+# Earlier turns shown to the planner, and the longest scalar repr kept in a description
+MAX_HISTORY_TURNS = 5
+MAX_REPR_CHARS = 200
+# Names the executor provides itself; never cached
+RESERVED_NAMES = {"df", "pd", "idx"}
+
+def _memory_bytes(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return len(repr(value))
+
+def describe_value(value: Any) -> str:
+    """One-line description of a cached intermediate for planner prompts."""
+    if isinstance(value, pd.DataFrame):
+        columns = ", ".join(f"{col} ({dtype})" for col, dtype in value.dtypes.astype(str).items())
+        return f"DataFrame, {len(value)} rows; columns: {columns}"
+    if isinstance(value, pd.Series):
+        sample = value.head(3).to_dict()
+        return f"Series '{value.name}', {len(value)} entries ({value.dtype}); e.g. {sample}"
+    text = repr(value)
+    if len(text) > MAX_REPR_CHARS:
+        text = text[:MAX_REPR_CHARS] + "..."
+    return f"{type(value).__name__}: {text}"
+
+class Session:
+    """
+    One analyst conversation: the named intermediate results earlier plans
+    computed, and the questions and code that produced them. Intermediates
+    are only valid for the dataset version they were computed from.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.dataset: Optional[Tuple[str, str, int]] = None
+        self.intermediates: "OrderedDict[str, Any]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.history: List[Dict[str, str]] = []
+        self.turn = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def memory_bytes(self) -> int:
+        # Copied first: the store reads the sizes of sessions busy in another request
+        return sum(self.sizes.copy().values())
+
+    def bind(self, dataset: str, epoch: str, version: int) -> None:
+        """
+        Drops the intermediates if the data they were computed from has
+        changed. The history is dropped too when the session moves to another
+        dataset or a reloaded one; new enrichment labels keep it.
+        """
+        key = (dataset, epoch, version)
+        if self.dataset is not None and self.dataset != key:
+            if self.intermediates:
+                logger.info(f"Session {self.session_id}: dataset changed, dropping {len(self.intermediates)} intermediates")
+                self.intermediates.clear()
+                self.sizes.clear()
+            if self.dataset[:2] != key[:2] and self.history:
+                logger.info(f"Session {self.session_id}: now on '{dataset}', dropping {len(self.history)} earlier turns")
+                self.history.clear()
+        self.dataset = key
+
+    def stamp(self, dataset: str, epoch: str, version: int) -> None:
+        """Records the dataset version the current intermediates are valid for."""
+        self.dataset = (dataset, epoch, version)
+
+    def variables(self) -> Dict[str, Any]:
+        """Intermediates to expose to generated code (frames as shallow copies)."""
+        return {
+            name: value.copy(deep=False) if isinstance(value, (pd.DataFrame, pd.Series)) else value
+            for name, value in self.intermediates.items()
+        }
+
+    def describe(self) -> str:
+        """Planner-facing summary of the earlier turns and the cached intermediates."""
+        lines = []
+        for entry in self.history[-MAX_HISTORY_TURNS:]:
+            lines.append(f"- Q{entry['turn']}: {entry['question']}")
+            lines.append("  Code:")
+            lines.extend(f"    {line}" for line in entry["code"].splitlines())
+        if self.intermediates:
+            lines.append("Cached variables (already defined in your namespace):")
+            for name, value in self.intermediates.items():
+                lines.append(f"- {name}: {describe_value(value)}")
+        return "\n".join(lines)
+
+    def record(self, question: str, code: str, namespace: Dict[str, Any], source: Any = None) -> None:
+        """
+        Stores the DataFrames, Series and result a plan produced. The source
+        frame itself is never cached; its rows are already available as `df`.
+        """
+        self.turn += 1
+        self.history.append({"turn": str(self.turn), "question": question, "code": code.strip()})
+        captured = {}
+        for name, value in namespace.items():
+            if name.startswith("_") or name in RESERVED_NAMES or value is source:
+                continue
+            if name == "result":
+                captured[f"result_q{self.turn}"] = value
+            elif isinstance(value, (pd.DataFrame, pd.Series)):
+                captured[name] = value
+        for name, value in captured.items():
+            self.intermediates.pop(name, None)
+            self.intermediates[name] = value
+            self.sizes[name] = _memory_bytes(value)
+
+    def evict_oldest(self) -> bool:
+        """Drops the oldest intermediate; returns False when none are left."""
+        if not self.intermediates:
+            return False
+        name, _ = self.intermediates.popitem(last=False)
+        self.sizes.pop(name, None)
+        logger.info(f"Session {self.session_id}: evicted intermediate '{name}'")
+        return True
+
+class SessionStore:
+    """
+    Conversation sessions with idle expiry and a shared memory budget for
+    their intermediates. Over budget, the oldest intermediates of the least
+    recently used sessions are dropped first.
+    """
+
+    def __init__(self, memory_budget_bytes: int = SESSION_MEMORY_BUDGET_MB * 2**20,
+                 ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Returns the session with this id, or a new one (unknown or expired ids start over)."""
+        with self._lock:
+            self._expire()
+            if session_id and session_id in self._sessions:
+                session = self._sessions[session_id]
+                self._sessions.move_to_end(session_id)
+            else:
+                session = Session(session_id or uuid.uuid4().hex[:16])
+                self._sessions[session.session_id] = session
+            session.last_used = time.monotonic()
+            return session
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_used < cutoff]:
+            del self._sessions[session_id]
+            logger.info(f"Session {session_id} expired")
+
+    def enforce_budget(self, keep: Optional[Session] = None) -> None:
+        """
+        Evicts intermediates until the store fits its budget, sparing `keep`
+        as long as possible. Sessions answering a question hold their lock
+        and are skipped; their intermediates are checked on a later call.
+        """
+        with self._lock:
+            total = sum(s.memory_bytes for s in self._sessions.values())
+            order = [s for s in self._sessions.values() if s is not keep]
+            if keep is not None:
+                order.append(keep)
+            for session in order:
+                if total <= self.memory_budget_bytes:
+                    break
+                if not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    while total > self.memory_budget_bytes:
+                        before = session.memory_bytes
+                        if not session.evict_oldest():
+                            break
+                        total -= before - session.memory_bytes
+                finally:
+                    session.lock.release()
@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
 import os
+import io
+import uuid
 import requests
-import seaborn as sns
 import logging
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 
 # Load environment variables
 load_dotenv()
@@ -191,13 +191,31 @@ st.sidebar.markdown("---")
 st.sidebar.markdown("Network Status")
 status_placeholder = st.sidebar.empty()
 
-def check_backend_health():
-    """Verify backend connectivity."""
+@st.cache_resource
+def get_http_session():
+    """Persistent HTTP session shared by all backend calls (connection reuse)."""
+    return requests.Session()
+
+http = get_http_session()
+
+@st.cache_data(ttl=300)
+def fetch_dataset_names():
+    """
+    List the datasets served by the backend (default first).
+    Failures raise, so an unreachable backend is not cached.
+    """
+    response = http.get(f"{BACKEND_URL}/datasets", timeout=3)
+    response.raise_for_status()
+    datasets = response.json()["datasets"]
+    return [d["name"] for d in sorted(datasets, key=lambda d: not d["default"])]
+
+def check_backend_health(dataset):
+    """Verify backend connectivity. Returns the health payload (with dataset version) or None."""
     try:
-        response = requests.get(f"{BACKEND_URL}/summary", timeout=3)
-        return response.status_code == 200
+        response = http.get(f"{BACKEND_URL}/health", params={"dataset": dataset}, timeout=3)
+        return response.json() if response.status_code == 200 else None
     except Exception:
-        return False
+        return None
 
 # App Guardrails
 if not api_key:
@@ -205,7 +223,14 @@ if not api_key:
     st.info("👋 Welcome! Please enter your Google Gemini API Key in the sidebar to activate the Intelligence Engine.")
     st.stop()
 
-if not check_backend_health():
+try:
+    dataset_names = fetch_dataset_names()
+except Exception as e:
+    logger.error(f"Dataset discovery failed: {e}")
+    dataset_names = None
+dataset = st.sidebar.selectbox("Dataset", dataset_names) if dataset_names else None
+health = check_backend_health(dataset) if dataset else None
+if health is None:
     status_placeholder.error("Backend Offline")
     st.error(f"Connectivity Issue: Remote Intelligence Server at {BACKEND_URL} is currently unreachable.")
     st.info("Troubleshooting: Ensure the backend process is active (`python -m src.api.server`).")
@@ -214,20 +239,123 @@ else:
     status_placeholder.success("Backend Online")
 
 # Data Synchronization
-@st.cache_data(ttl=300)
-def fetch_intelligence_data():
-    """Fetch analytics and raw data from the backend."""
+@st.cache_data(ttl=300, max_entries=4)
+def fetch_summary(dataset, epoch, version):
+    """
+    Fetch analytics for a given dataset version (cached per version).
+    Failures raise, so they are not cached.
+    """
+    response = http.get(f"{BACKEND_URL}/summary", params={"dataset": dataset})
+    response.raise_for_status()
+    return response.json()
+
+def sync_intelligence_data(dataset, epoch, version):
+    """
+    Bring the session's copy of the raw data up to the backend's dataset version,
+    fetching only the rows changed since the version already held.
+    """
+    state = st.session_state
+    if state.get("data_dataset") != dataset:
+        # Switching datasets discards the copy held for the previous one
+        state.data_dataset, state.data_df, state.data_epoch, state.data_version = dataset, None, None, 0
+    if state.get("data_epoch") == epoch and state.get("data_version") == version:
+        return state.data_df
     try:
-        summary_resp = requests.get(f"{BACKEND_URL}/summary")
-        data_resp = requests.get(f"{BACKEND_URL}/data")
-        return summary_resp.json(), pd.DataFrame(data_resp.json())
+        params = {"since": state.get("data_version", 0), "epoch": state.get("data_epoch"), "dataset": dataset}
+        payload = http.get(f"{BACKEND_URL}/data/delta", params=params).json()
     except Exception as e:
         logger.error(f"Synchronization failed: {e}")
-        return None, None
+        return state.get("data_df")
+
+    rows = pd.DataFrame(payload["rows"], index=payload["row_ids"])
+    current = state.get("data_df")
+    if payload["full"] or current is None:
+        merged = rows
+    else:
+        columns = list(current.columns) + [c for c in rows.columns if c not in current.columns]
+        merged = pd.concat([current.drop(index=rows.index, errors="ignore"), rows])
+        merged = merged.sort_index().reindex(columns=columns)
+    logger.info(f"Synchronized {len(rows)} rows (full={payload['full']}) to version {payload['version']}")
+
+    state.data_df = merged
+    state.data_epoch = payload["epoch"]
+    state.data_version = payload["version"]
+    return merged
+
+@st.cache_data(ttl=300, max_entries=4)
+def fetch_aggregates(dataset, epoch, version):
+    """
+    Fetch precomputed chart inputs for a given dataset version (cached per version).
+    Failures raise, so they are not cached.
+    """
+    response = http.get(f"{BACKEND_URL}/aggregates", params={"dataset": dataset})
+    response.raise_for_status()
+    return response.json()
 
-summary, df = fetch_intelligence_data()
+# Chart Rendering
+def _styled_axes():
+    """Create a figure/axes pair with the dashboard's dark styling."""
+    import matplotlib.pyplot as plt
 
-if df is None or df.empty:
+    plt.style.use('dark_background')
+    fig, ax = plt.subplots(figsize=(8, 5))
+    fig.patch.set_facecolor('#0a192f')
+    ax.set_facecolor('#0a192f')
+    ax.tick_params(colors='#ffffff') # Pure white
+    ax.xaxis.label.set_color('#ffffff')
+    ax.yaxis.label.set_color('#ffffff')
+    return fig, ax
+
+@st.cache_data(max_entries=16)
+def render_chart(kind, epoch, version, _aggregates):
+    """
+    Render one dashboard chart from precomputed aggregates to PNG bytes.
+    Cached per dataset version, so reruns reuse the rendered image.
+    matplotlib/seaborn are imported here, on the first cache miss only.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = _styled_axes()
+    if kind == "status":
+        counts = _aggregates["status_counts"]
+        ax.bar(list(counts), list(counts.values()), color=sns.color_palette('viridis', len(counts)))
+        ax.set_xlabel('claim_status')
+        ax.set_ylabel('count')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == "urgency":
+        stats = [{"label": insurer, **box} for insurer, box in _aggregates["urgency_by_insurer"].items()]
+        boxes = ax.bxp(stats, patch_artist=True)
+        for patch, color in zip(boxes["boxes"], sns.color_palette('magma', len(stats))):
+            patch.set_facecolor(color)
+        ax.set_xlabel('insurer_name')
+        ax.set_ylabel('urgency')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif kind == "category":
+        counts = _aggregates["category_counts"]
+        ax.barh(list(counts), list(counts.values()), color=sns.color_palette('rocket', len(counts)))
+        ax.invert_yaxis()
+        ax.set_xlabel('count')
+        ax.set_ylabel('denial_category')
+    elif kind == "tone":
+        counts = _aggregates["tone_counts"]
+        colors = ['#64ffda' if t == 'Cooperative' else '#ff4d4d' for t in counts]
+        ax.pie(list(counts.values()), labels=list(counts), autopct='%1.1f%%', colors=colors, textprops={'color': "w"})
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", facecolor=fig.get_facecolor(), bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+try:
+    summary = fetch_summary(dataset, health["epoch"], health["version"])
+    aggregates = fetch_aggregates(dataset, health["epoch"], health["version"])
+except Exception as e:
+    logger.error(f"Analytics synchronization failed: {e}")
+    summary = aggregates = None
+df = sync_intelligence_data(dataset, health["epoch"], health["version"])
+
+if summary is None or aggregates is None or df is None or df.empty:
     st.warning("Intelligence streams are currently empty.")
     st.stop()
 
@@ -241,6 +369,9 @@ if "current_ai_response" not in st.session_state:
     st.session_state.current_ai_response = None
 if "is_processing" not in st.session_state:
     st.session_state.is_processing = False
+if "conversation_id" not in st.session_state:
+    # Follow-up questions share this id so the backend can reuse earlier results
+    st.session_state.conversation_id = uuid.uuid4().hex
 
 # Query Interface
 st.markdown("### Model Instruction")
@@ -257,17 +388,30 @@ if st.button("Execute Intelligence Query", use_container_width=True, disabled=st
     st.session_state.is_processing = True
     st.rerun()
 
+if st.button("Start New Conversation", use_container_width=True, disabled=st.session_state.is_processing):
+    try:
+        http.delete(f"{BACKEND_URL}/sessions/{st.session_state.conversation_id}", timeout=5)
+    except requests.RequestException as e:
+        logger.warning(f"Could not discard conversation: {e}")
+    st.session_state.conversation_id = uuid.uuid4().hex
+    st.session_state.current_ai_response = None
+    st.rerun()
+
 # Processing block triggered by the click
 if st.session_state.is_processing:
     try:
         with st.spinner("Analyzing data streams..."):
-            payload = {"question": user_query, "api_key": api_key}
-            response = requests.post(f"{BACKEND_URL}/ask", json=payload, timeout=90)
+            payload = {
+                "question": user_query,
+                "api_key": api_key,
+                "dataset": dataset,
+                "session_id": st.session_state.conversation_id,
+            }
+            response = http.post(f"{BACKEND_URL}/ask", json=payload, timeout=90)
             
             if response.status_code == 200:
+                # AI-enriched columns (category/tone) arrive through the next delta sync
                 st.session_state.current_ai_response = response.json()["response"]
-                # Clear cache to ensure dashboard reflects AI-enriched columns (category/tone)
-                st.cache_data.clear()
             else:
                 st.error(f"Analysis failed: {response.text}")
     except Exception as e:
@@ -302,59 +446,26 @@ with tab_viz:
     st.markdown("---")
     col_left, col_right = st.columns(2)
     
-    # Global visual styling
-    plt.style.use('dark_background')
-    
     with col_left:
         st.markdown("##### Distribution of Claim States")
-        fig1, ax1 = plt.subplots(figsize=(8, 5))
-        fig1.patch.set_facecolor('#0a192f')
-        ax1.set_facecolor('#0a192f')
-        sns.countplot(data=df, x='claim_status', palette='viridis', ax=ax1)
-        plt.xticks(rotation=45, color='#ffffff') # Pure white
-        plt.yticks(color='#ffffff') # Pure white
-        ax1.xaxis.label.set_color('#ffffff')
-        ax1.yaxis.label.set_color('#ffffff')
-        st.pyplot(fig1)
+        st.image(render_chart("status", health["epoch"], health["version"], aggregates))
         
     with col_right:
         st.markdown("##### Urgency Distribution by Provider")
-        fig2, ax2 = plt.subplots(figsize=(8, 5))
-        fig2.patch.set_facecolor('#0a192f')
-        ax2.set_facecolor('#0a192f')
-        sns.boxplot(data=df, x='insurer_name', y='urgency', palette='magma', ax=ax2)
-        plt.xticks(rotation=45, color='#ffffff') # Pure white
-        plt.yticks(color='#ffffff') # Pure white
-        ax2.xaxis.label.set_color('#ffffff')
-        ax2.yaxis.label.set_color('#ffffff')
-        st.pyplot(fig2)
+        st.image(render_chart("urgency", health["epoch"], health["version"], aggregates))
 
     # AI Enrichment Insights
-    if 'denial_category' in df.columns and 'tone' in df.columns:
+    if aggregates["category_counts"] and aggregates["tone_counts"]:
         st.markdown("---")
         col_c1, col_c2 = st.columns(2)
         
         with col_c1:
             st.markdown("##### 🔍 AI Insights: Denial Categories")
-            fig3, ax3 = plt.subplots(figsize=(8, 5))
-            fig3.patch.set_facecolor('#0a192f')
-            ax3.set_facecolor('#0a192f')
-            sns.countplot(data=df, y='denial_category', palette='rocket', ax=ax3)
-            plt.xticks(color='#ffffff')
-            plt.yticks(color='#ffffff')
-            ax3.xaxis.label.set_color('#ffffff')
-            ax3.yaxis.label.set_color('#ffffff')
-            st.pyplot(fig3)
+            st.image(render_chart("category", health["epoch"], health["version"], aggregates))
             
         with col_c2:
             st.markdown("##### 🎭 AI Insights: Insurer Tone")
-            fig4, ax4 = plt.subplots(figsize=(8, 5))
-            fig4.patch.set_facecolor('#0a192f')
-            ax4.set_facecolor('#0a192f')
-            tone_counts = df['tone'].value_counts()
-            colors = ['#64ffda' if t == 'Cooperative' else '#ff4d4d' for t in tone_counts.index]
-            plt.pie(tone_counts, labels=tone_counts.index, autopct='%1.1f%%', colors=colors, textprops={'color':"w"})
-            st.pyplot(fig4)
+            st.image(render_chart("tone", health["epoch"], health["version"], aggregates))
 
 with tab_raw:
     st.markdown("### Communication Logs")
@@ -1,21 +1,24 @@
 import pandas as pd
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 logger = logging.getLogger("MDCCapital.Utils")
 
 def load_data(file_path: str) -> pd.DataFrame:
     """
-    Load and parse the provided CSV file.
+    Load and parse the provided CSV (or Parquet) file.
     
     Args:
-        file_path (str): Path to the CSV data file.
+        file_path (str): Path to the CSV or Parquet data file.
         
     Returns:
         pd.DataFrame: Loaded data or empty DataFrame on failure.
     """
     try:
-        df = pd.read_csv(file_path)
+        if file_path.endswith(".parquet"):
+            df = pd.read_parquet(file_path)
+        else:
+            df = pd.read_csv(file_path)
         logger.info(f"Successfully loaded {len(df)} records from {file_path}")
         return df
     except Exception as e:
@@ -50,3 +53,52 @@ def get_data_summary(df: pd.DataFrame) -> Dict[str, Any]:
         "avg_days": float(df['days_since_submission'].mean())
     }
     return summary
+
+def _box_stats(values: pd.Series) -> Dict[str, Any]:
+    """
+    Tukey box-plot statistics (1.5 IQR whiskers) in the layout expected by
+    matplotlib's `Axes.bxp`.
+    """
+    q1, med, q3 = (float(v) for v in values.quantile([0.25, 0.5, 0.75]))
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    fliers: List[float] = values[~values.index.isin(inside.index)].astype(float).tolist()
+    return {
+        "q1": q1,
+        "med": med,
+        "q3": q3,
+        "whislo": float(inside.min()),
+        "whishi": float(inside.max()),
+        "fliers": fliers,
+    }
+
+def get_chart_aggregates(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Precompute the small inputs needed to draw the dashboard charts.
+    
+    Args:
+        df (pd.DataFrame): The input records.
+        
+    Returns:
+        Dict[str, Any]: Claim status counts, urgency box statistics per insurer
+                        and, once the data is enriched, denial category and tone counts.
+    """
+    aggregates: Dict[str, Any] = {
+        "status_counts": {},
+        "urgency_by_insurer": {},
+        "category_counts": {},
+        "tone_counts": {},
+    }
+    if df.empty:
+        return aggregates
+
+    aggregates["status_counts"] = df['claim_status'].value_counts(sort=False).to_dict()
+    aggregates["urgency_by_insurer"] = {
+        insurer: _box_stats(group.dropna())
+        for insurer, group in df.groupby('insurer_name', sort=False)['urgency']
+        if group.notna().any()
+    }
+    if 'denial_category' in df.columns and 'tone' in df.columns:
+        aggregates["category_counts"] = df['denial_category'].value_counts().to_dict()
+        aggregates["tone_counts"] = df['tone'].value_counts().to_dict()
+    return aggregates
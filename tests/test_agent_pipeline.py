@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from src import agent as agent_module
+from src.agent import MISSING_RESULT, MDCCapitalAgent
+from src.llm_scheduler import LLMScheduler
+from src.sessions import Session
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+class ScriptedPlanner:
+    """Answers planner prompts with the next scripted plan and anything else with a canned report."""
+
+    def __init__(self, *plans):
+        self.plans = list(plans)
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if "User Question:" in prompt:
+            return _Response(f"```python\n{self.plans.pop(0)}\n```")
+        return _Response("Report")
+
+@pytest.fixture(autouse=True)
+def unpaced_scheduler(monkeypatch):
+    scheduler = LLMScheduler(requests_per_minute=60_000, burst=1_000)
+    monkeypatch.setattr(agent_module, "get_scheduler", lambda: scheduler)
+
+@pytest.fixture
+def df():
+    # Already enriched, so asking goes straight to planning
+    return pd.DataFrame({
+        "insurer_name": ["Aetna", "Cigna", "Aetna", "Humana", "Cigna", "Aetna"],
+        "urgency": [1, 5, 3, 4, 2, 5],
+        "communication_text": ["a", "b", "c", "d", "e", "f"],
+        "denial_category": ["Prior Auth"] * 6,
+        "tone": ["Obstructive"] * 6,
+    })
+
+def _agent(df, *plans, session=None):
+    agent = MDCCapitalAgent(df, api_key="test", session=session)
+    agent.llm = ScriptedPlanner(*plans)
+    return agent
+
+def test_plans_cannot_modify_the_shared_frame(df):
+    agent = _agent(df, "df.drop(df.index[:2], inplace=True)\ndf['flag'] = 1\nresult = len(df)")
+    assert "**4**" in agent.ask("How many rows after dropping two?")
+    assert len(df) == 6
+    assert "flag" not in df.columns
+
+def test_session_does_not_cache_the_source_frame(df):
+    session = Session("s")
+    agent = _agent(df, "everything = df\nresult = len(everything)", session=session)
+    agent.ask("How many rows?")
+    assert "everything" not in session.intermediates
+
+def _planner_calls(llm):
+    return [prompt for prompt in llm.prompts if "User Question:" in prompt]
+
+def test_plan_without_result_is_replanned_not_reported(df):
+    agent = _agent(df, "late = df[df['urgency'] > 3]", "late = df[df['urgency'] > 3]")
+    answer = agent.ask("Which claims are urgent?")
+    planner_calls = _planner_calls(agent.llm)
+    assert len(planner_calls) == 2
+    assert MISSING_RESULT in planner_calls[1]
+    assert len(agent.llm.prompts) == 2  # no reporter call
+    assert agent.pipeline_stats["execution_retries"] == 1
+    assert answer.startswith("Strategic Analysis Failed")
+
+def test_replanned_result_is_what_gets_reported(df):
+    agent = _agent(df, "late = df[df['urgency'] > 3]", "result = df.groupby('insurer_name')['urgency'].mean()")
+    assert agent.ask("Average urgency per insurer?") == "Report"
+    reports = [prompt for prompt in agent.llm.prompts if "User Question:" not in prompt]
+    assert len(_planner_calls(agent.llm)) == 2
+    assert len(reports) == 1
+    assert "Humana" in reports[0] and MISSING_RESULT not in reports[0]
@@ -0,0 +1,96 @@
+import json
+import re
+
+import pandas as pd
+import pytest
+
+from src import agent as agent_module
+from src.agent import MAX_ENRICHMENT_ATTEMPTS, MDCCapitalAgent
+from src.llm_scheduler import LLMScheduler
+
+WORDS = ["denied", "prior", "authorization", "missing", "records", "appeal", "coding", "modifier",
+         "duplicate", "experimental", "necessity", "approved", "pending", "review", "coverage", "network"]
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+class FakeLabeler:
+    """Labels every row it is sent, except texts containing a `bad` marker or when it is told to fail."""
+
+    def __init__(self, bad=(), error=None, garbled_calls=()):
+        self.bad = bad
+        self.error = error
+        self.garbled_calls = set(garbled_calls)
+        self.chunks = []
+
+    def invoke(self, prompt):
+        rows = re.findall(r"ID (\d+): (.*)", prompt)
+        self.chunks.append(len(rows))
+        if self.error is not None:
+            raise self.error
+        if len(self.chunks) in self.garbled_calls:
+            return _Response("Sorry, I cannot help with that.")
+        labels = [{"id": int(i), "category": "Prior Auth", "tone": "Obstructive"}
+                  for i, text in rows if not any(marker in text for marker in self.bad)]
+        return _Response(f"```json\n{json.dumps(labels)}\n```")
+
+@pytest.fixture(autouse=True)
+def unpaced_scheduler(monkeypatch):
+    scheduler = LLMScheduler(requests_per_minute=60_000, burst=1_000)
+    monkeypatch.setattr(agent_module, "get_scheduler", lambda: scheduler)
+
+def _agent(rows, llm, attempts=None):
+    # Distinct word orders, so near-duplicate clustering keeps every row
+    texts = [" ".join(WORDS[(i + j * 5) % len(WORDS)] for j in range(8)) + f" {WORDS[i % 7]} case {chr(97 + i)}"
+             for i in range(rows)]
+    df = pd.DataFrame({"communication_text": texts, "urgency": range(rows)})
+    agent = MDCCapitalAgent(df, api_key="test", enrichment_attempts=attempts)
+    agent.llm = llm
+    return agent
+
+def test_clean_pass_labels_every_row_in_one_call():
+    llm = FakeLabeler()
+    agent = _agent(10, llm)
+    agent.enrich()
+    assert llm.chunks == [10]
+    assert agent.unenriched_positions == []
+    assert agent.df["tone"].eq("Obstructive").all()
+
+def test_unparseable_chunk_is_bisected_down_to_labels():
+    llm = FakeLabeler(garbled_calls={1})
+    agent = _agent(8, llm)
+    agent.enrich()
+    assert llm.chunks == [8, 4, 4]
+    assert agent.unenriched_positions == []
+
+def test_rows_missing_from_a_response_are_resent_alone():
+    llm = FakeLabeler(bad=(" case c",))
+    agent = _agent(6, llm)
+    agent.enrich()
+    # The five labeled rows are kept; only the missing one is re-sent, then given up on
+    assert llm.chunks == [6, 1]
+    assert agent.unenriched_positions == [2]
+    assert agent.enrichment_attempts == {2: 1}
+
+def test_failing_row_stops_being_retried_until_an_explicit_rerun():
+    llm = FakeLabeler(bad=(" case c",))
+    attempts = {}
+    for _ in range(MAX_ENRICHMENT_ATTEMPTS + 1):
+        agent = _agent(6, llm, attempts)
+        agent.df["denial_category"] = ["Prior Auth", "Prior Auth", None] + ["Prior Auth"] * 3
+        agent.df["tone"] = ["Obstructive", "Obstructive", None] + ["Obstructive"] * 3
+        llm.chunks.clear()
+        agent.enrich()
+    assert llm.chunks == []
+    assert attempts == {2: MAX_ENRICHMENT_ATTEMPTS}
+    agent.enrich(retry_exhausted=True)
+    assert llm.chunks == [1]
+
+def test_failed_call_aborts_the_pass_without_bisecting_or_charging_rows():
+    llm = FakeLabeler(error=RuntimeError("401 API key not valid"))
+    agent = _agent(40, llm)
+    agent.enrich()
+    assert llm.chunks == [agent_module.INITIAL_CHUNK_SIZE]
+    assert len(agent.unenriched_positions) == 40
+    assert agent.enrichment_attempts == {}
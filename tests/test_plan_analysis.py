@@ -0,0 +1,188 @@
+import pandas as pd
+import pytest
+
+from src.plan_analysis import analyze_plan, rewrite_plan
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "insurer_name": ["Aetna", "Cigna", "Aetna", "Humana"],
+        "urgency": [1, 5, 3, 4],
+        "days_since_submission": [10, 45, 30, 60],
+        "communication_text": ["Claim denied", "Need more info", "Approved", "Denied: missing auth"],
+    })
+
+def _run(code, df):
+    scope = {"df": df.copy(), "pd": pd}
+    exec(code, {}, scope)
+    return scope["result"]
+
+# --- Rewrites ---------------------------------------------------------------
+
+@pytest.mark.parametrize("expression", [
+    "r['days_since_submission'] - r['urgency']",
+    "r['days_since_submission'] * 2 + 1",
+    "-r['urgency']",
+    "r['urgency'] == 3",
+    "r['urgency'] != 3",
+    "r['urgency'] < 3",
+    "r['urgency'] <= 3",
+    "r['urgency'] > 3",
+    "r['urgency'] >= 3",
+    "r['days_since_submission'] > r['urgency'] * 10",
+])
+def test_row_apply_is_vectorized_with_the_same_result(df, expression):
+    code = f"result = df.apply(lambda r: {expression}, axis=1)"
+    rewritten, applied = rewrite_plan(code)
+    assert applied == ["row-apply"]
+    assert "apply" not in rewritten
+    pd.testing.assert_series_equal(_run(rewritten, df), _run(code, df), check_names=False)
+
+@pytest.mark.parametrize("expression", [
+    "r['urgency'] is None",
+    "r['urgency'] is not None",
+    "r['insurer_name'] in 'Aetna Cigna'",
+    "r['insurer_name'] not in 'Aetna'",
+    "r['urgency'] == None",
+    "not r['urgency']",
+    "~r['urgency']",
+    "1 < r['urgency'] < 4",
+    "r['urgency'] > threshold",
+    "len(r['insurer_name'])",
+    "r.urgency + 1",
+    "2 * 3",
+    "-1",
+    "1 < 2",
+])
+def test_row_apply_outside_the_allow_list_is_left_alone(expression):
+    code = f"result = df.apply(lambda r: {expression}, axis=1)"
+    assert rewrite_plan(code) == (code, [])
+
+def test_row_apply_with_extra_arguments_is_left_alone():
+    code = "result = df.apply(lambda r: r['urgency'] + 1, axis=1, result_type='reduce')"
+    assert rewrite_plan(code) == (code, [])
+
+def test_column_apply_is_left_alone():
+    code = "result = df['urgency'].apply(lambda v: v + 1)"
+    assert rewrite_plan(code) == (code, [])
+
+def test_or_of_str_contains_is_merged_into_one_regex(df):
+    code = ("result = df[df['communication_text'].str.contains('denied', case=False) | "
+            "df['communication_text'].str.contains('missing', case=False)]")
+    rewritten, applied = rewrite_plan(code)
+    assert applied == ["repeated-str-contains"]
+    assert rewritten.count("str.contains") == 1
+    pd.testing.assert_frame_equal(_run(rewritten, df), _run(code, df))
+
+@pytest.mark.parametrize("code", [
+    # Different receivers
+    "result = df['communication_text'].str.contains('a') | df['insurer_name'].str.contains('b')",
+    # Different keyword arguments
+    "result = df['communication_text'].str.contains('a', case=False) | df['communication_text'].str.contains('b')",
+    # Literal (non-regex) patterns
+    "result = df['communication_text'].str.contains('a', regex=False) | "
+    "df['communication_text'].str.contains('b', regex=False)",
+    # AND is not an alternation
+    "result = df['communication_text'].str.contains('a') & df['communication_text'].str.contains('b')",
+])
+def test_str_contains_that_cannot_be_merged_is_left_alone(code):
+    assert rewrite_plan(code) == (code, [])
+
+def test_unparseable_plan_is_returned_unchanged():
+    assert rewrite_plan("result = (") == ("result = (", [])
+
+# --- Analysis ---------------------------------------------------------------
+
+def test_vectorized_plan_is_linear_and_clean():
+    analysis = analyze_plan(
+        "late = df[df['days_since_submission'] > 30]\n"
+        "result = late.groupby('insurer_name')['urgency'].mean()"
+    )
+    assert analysis.findings == []
+    assert analysis.complexity == "O(n)"
+    assert not analysis.blocking
+
+@pytest.mark.parametrize("code, rule", [
+    ("for _, row in df.iterrows():\n    print(row['urgency'])", "row-iteration"),
+    ("for row in df.itertuples():\n    print(row.urgency)", "row-iteration"),
+    ("for i in range(len(df)):\n    print(df['urgency'].iloc[i])", "python-loop"),
+    ("for i in range(df.shape[0]):\n    print(i)", "python-loop"),
+    ("for v in df['urgency']:\n    print(v)", "python-loop"),
+    ("for v in df.urgency.tolist():\n    print(v)", "python-loop"),
+    ("for i in df.index:\n    print(i)", "python-loop"),
+    ("for a, b in zip(df['urgency'], df['days_since_submission']):\n    print(a + b)", "python-loop"),
+    ("for k, v in df['urgency'].items():\n    print(k, v)", "python-loop"),
+    ("for r in df.to_dict('records'):\n    print(r['urgency'])", "python-loop"),
+    ("for i, r in df.to_dict(orient='index').items():\n    print(i, r)", "python-loop"),
+    ("for k in df['urgency'].to_dict():\n    print(k)", "python-loop"),
+    ("late = df[df['urgency'] > 3]['insurer_name']\nresult = [name.upper() for name in late]", "python-loop"),
+])
+def test_row_iteration_is_blocking(code, rule):
+    analysis = analyze_plan(code)
+    assert [f.rule for f in analysis.findings] == [rule]
+    assert analysis.blocking
+    assert analysis.row_passes == 1
+
+def test_row_apply_is_blocking():
+    analysis = analyze_plan("result = df.apply(lambda r: r['urgency'] * 2, axis=1)")
+    assert [f.rule for f in analysis.findings] == ["row-apply"]
+    assert analysis.blocking
+
+@pytest.mark.parametrize("code", [
+    "for col in df.columns:\n    print(col)",
+    "for col in df:\n    print(col)",
+    "for col, dtype in df.dtypes.items():\n    print(col, dtype)",
+    "for name, values in df.items():\n    print(name)",
+    "for name, values in df.to_dict().items():\n    print(name)",
+    "for name in df.to_dict('list'):\n    print(name)",
+    "top = df['insurer_name'].value_counts().head(3).index\nresult = [n.upper() for n in top]",
+    "for _, row in df.nlargest(5, 'urgency').iterrows():\n    print(row)",
+    "for i in range(10):\n    print(i)",
+    "result = [c for c in ['a', 'b']]",
+])
+def test_bounded_and_column_loops_are_not_row_loops(code):
+    analysis = analyze_plan(code)
+    assert analysis.findings == []
+    assert analysis.row_passes == 0
+    assert analysis.complexity == "O(n)"
+
+@pytest.mark.parametrize("iterable", [
+    "df['insurer_name'].unique()",
+    "df['insurer_name'].value_counts().index",
+    "df.groupby('insurer_name')['urgency'].mean().index",
+])
+def test_loop_over_groups_with_a_scan_is_k_times_n(iterable):
+    analysis = analyze_plan(
+        f"result = {{}}\n"
+        f"for name in {iterable}:\n"
+        f"    result[name] = df[df['insurer_name'] == name]['urgency'].mean()"
+    )
+    assert analysis.findings == []
+    assert analysis.complexity == "O(k*n)"
+    assert analysis.group_scans > 0
+
+def test_scan_inside_row_loop_is_quadratic():
+    analysis = analyze_plan(
+        "for _, row in df.iterrows():\n"
+        "    matches = df[df['insurer_name'] == row['insurer_name']]"
+    )
+    assert analysis.quadratic
+    assert analysis.complexity == "O(n^2)"
+
+def test_repeated_str_contains_is_reported_without_blocking():
+    analysis = analyze_plan(
+        "mask = df['communication_text'].str.contains('denied') | df['communication_text'].str.contains('missing')\n"
+        "result = df[mask]"
+    )
+    assert [f.rule for f in analysis.findings] == ["repeated-str-contains"]
+    assert not analysis.blocking
+
+def test_row_loop_costs_more_than_vectorized_plan():
+    loop = analyze_plan("for v in df['urgency']:\n    print(v)")
+    vectorized = analyze_plan("result = df['urgency'].sum()")
+    assert loop.estimated_cost(1000) > vectorized.estimated_cost(1000)
+
+def test_parse_error_is_reported():
+    analysis = analyze_plan("result = (")
+    assert analysis.parse_error
+    assert not analysis.blocking
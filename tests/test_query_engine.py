@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from src.query_engine import DuckDBEngine
+
+@pytest.fixture
+def engine(tmp_path):
+    pd.DataFrame({
+        "insurer_name": ["Aetna", None, "Cigna", "Aetna"],
+        "urgency": [1, 5, 3, 4],
+    }).to_parquet(tmp_path / "claims.parquet")
+    return DuckDBEngine(str(tmp_path / "*.parquet"))
+
+def test_schema_is_described_once_from_leading_samples(engine, monkeypatch):
+    queries = []
+    run = engine.query
+    monkeypatch.setattr(engine, "query", lambda sql, params=None: queries.append(sql) or run(sql, params))
+    description = engine.schema_description()
+    assert "- insurer_name (VARCHAR): e.g., ['Aetna', 'Cigna', 'Aetna']" in description
+    assert not any("DISTINCT" in sql for sql in queries)
+
+    queries.clear()
+    assert engine.schema_description() == description
+    engine.filtered({"urgency": (2, None)}, limit=10)
+    assert not any(sql.startswith("DESCRIBE") for sql in queries)
+
+@pytest.mark.parametrize("sql", [
+    "COPY df TO 'out.csv'",
+    "SELECT 1; SELECT 2",
+    "SET lock_configuration = false",
+    "SELECT * FROM read_csv('/etc/passwd')",
+])
+def test_only_a_single_select_on_the_dataset_runs(engine, sql):
+    with pytest.raises(Exception):
+        engine.execute_plan(sql)
+    assert len(engine.execute_plan("WITH a AS (SELECT * FROM df) SELECT count(*) AS n FROM a")) == 1
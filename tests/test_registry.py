@@ -0,0 +1,34 @@
+import threading
+
+import pandas as pd
+
+from src.api.store import DatasetRegistry, DatasetSource
+
+def _frame(path):
+    return pd.DataFrame({"insurer_name": [path], "urgency": [1]})
+
+def test_slow_load_does_not_block_other_datasets():
+    release = threading.Event()
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        if path == "big.csv":
+            release.wait(5)
+        return _frame(path)
+
+    registry = DatasetRegistry({"big": DatasetSource("big.csv"), "small": DatasetSource("small.csv")},
+                               "small", 2**30, loader)
+    waiters = [threading.Thread(target=registry.get, args=("big",)) for _ in range(2)]
+    for thread in waiters:
+        thread.start()
+    try:
+        # Answered while "big" is still loading
+        assert registry.get("small").df["insurer_name"].tolist() == ["small.csv"]
+    finally:
+        release.set()
+        for thread in waiters:
+            thread.join()
+    # Concurrent requests for the same dataset share one load
+    assert loads.count("big.csv") == 1
+    assert registry.get("big") is registry.get("big")
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from src.agent import _format_scalar
+
+@pytest.mark.parametrize("value, text", [
+    (1234.5678, "1,234.57"),
+    (-2.5, "-2.50"),
+    (3.0, "3"),
+    (0.0123456, "0.01235"),
+    (np.float64(0.98765), "0.9877"),
+    (-0.00042, "-0.00042"),
+    (float("nan"), "n/a"),
+    (12000, "12,000"),
+    (np.bool_(True), "Yes"),
+])
+def test_scalars_keep_significant_digits(value, text):
+    assert _format_scalar(value) == text
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from src.sessions import Session, SessionStore
+
+def _frame(rows):
+    return pd.DataFrame({"urgency": range(rows)})
+
+def _cached_bytes():
+    session = Session("probe")
+    session.record("q", "late = df", {"late": _frame(1000)})
+    return session.memory_bytes
+
+def _store_with_two_sessions(budget):
+    store = SessionStore(memory_budget_bytes=budget)
+    first, second = store.get("first"), store.get("second")
+    first.record("q1", "late = df", {"late": _frame(1000)})
+    second.record("q1", "late = df", {"late": _frame(1000)})
+    return store, first, second
+
+def test_new_enrichment_labels_keep_history_but_drop_intermediates():
+    session = Session("s")
+    session.bind("claims", "e1", 1)
+    session.record("Which insurer is slowest?", "result = 1", {"late": _frame(3)})
+    session.bind("claims", "e1", 2)
+    assert session.intermediates == {}
+    assert len(session.history) == 1
+
+def test_switching_dataset_or_reloading_drops_history():
+    session = Session("s")
+    session.bind("claims", "e1", 1)
+    session.record("Which insurer is slowest?", "result = 1", {})
+    session.bind("appeals", "e1", 1)
+    assert session.history == []
+    session.record("How many appeals?", "result = 2", {})
+    session.bind("appeals", "e2", 1)
+    assert session.history == []
+    assert session.describe() == ""
+
+def test_budget_evicts_least_recently_used_session_first():
+    store, first, second = _store_with_two_sessions(budget=_cached_bytes() + 1)
+    store.enforce_budget(keep=second)
+    assert first.intermediates == {}
+    assert "late" in second.intermediates
+
+def test_budget_skips_sessions_that_are_answering_a_question():
+    store, first, second = _store_with_two_sessions(budget=_cached_bytes() + 1)
+    with first.lock:
+        store.enforce_budget(keep=second)
+    assert "late" in first.intermediates
+    assert second.intermediates == {}
+
+def test_history_keeps_the_code_runnable():
+    session = Session("s")
+    code = "late = df[df['days'] > 30]\nfor name in late['insurer']:\n    print(name)\nresult = len(late)\n"
+    session.record("How many late claims?", code, {})
+    assert session.describe().splitlines() == [
+        "- Q1: How many late claims?",
+        "  Code:",
+        "    late = df[df['days'] > 30]",
+        "    for name in late['insurer']:",
+        "        print(name)",
+        "    result = len(late)",
+    ]